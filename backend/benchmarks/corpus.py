@@ -0,0 +1,135 @@
+"""
+Synthetic email corpus for benchmarks.
+
+Generates deterministic email bodies of several kinds (plain text, HTML,
+quoted replies and multilingual) and sizes, so benchmark runs on different
+commits see exactly the same input.
+"""
+import random
+
+KINDS = ("plain", "html", "quoted", "multilingual")
+
+# Approximate body length in words
+SIZES = {"short": 40, "medium": 150, "long": 600}
+
+GREETINGS = ["Hi team,", "Hello Anna,", "Dear Mr. Peters,", "Hey all,", "Good morning,"]
+CLOSINGS = ["Best regards,\nEmil", "Kind regards,\nEmil Lambert", "Thanks,\nE.", "Cheers,\nEmil", "Best,\nEmil"]
+
+SENTENCES = [
+    "Thank you for sending over the latest version of the proposal.",
+    "I think we should definitely schedule a call before Friday to go through the open points.",
+    "Could you please confirm whether the budget was approved by finance?",
+    "Unfortunately the delivery was delayed again, which is really frustrating for the whole team.",
+    "The report was reviewed by the committee and a few minor changes were requested.",
+    "We are excited to share that the pilot exceeded our expectations!",
+    "Perhaps it would make sense to involve the engineering team earlier next time.",
+    "I'm not sure we can make the deadline if the requirements keep changing.",
+    "Let me know if you have any questions or if anything is unclear.",
+    "Attached you will find the slides from yesterday's presentation :)",
+    "It was great to meet you at the conference last week 😊",
+    "The numbers look good, but we need to double-check the assumptions in section three.",
+    "Would you be available for a short meeting on Tuesday afternoon?",
+    "I appreciate your help with this, it made a big difference.",
+    "Obviously this is not ideal, but we will find a workable solution.",
+]
+
+BULLETS = ["- Review the draft agreement", "- Update the project timeline", "- Book the meeting room",
+           "* Send the invoice to accounting", "1. Collect feedback from the customer"]
+
+FOREIGN_SENTENCES = [
+    "Bedankt voor je snelle reactie, ik kijk er naar uit.",
+    "Kunnen we volgende week een afspraak inplannen?",
+    "Vielen Dank für Ihre Nachricht, wir melden uns so bald wie möglich.",
+    "Könnten Sie mir bitte die Unterlagen bis Freitag schicken?",
+    "Merci beaucoup pour votre retour rapide.",
+    "Pourriez-vous me confirmer la date de la réunion ?",
+]
+
+FOREIGN_REPLY_HEADERS = [
+    "Op 3 mei 2025 om 10:15 schreef Anna de Vries <anna@example.nl>:",
+    "Am 3. Mai 2025 um 10:15 schrieb Jonas Weber <jonas@example.de>:",
+    "Le 3 mai 2025 à 10:15, Claire Martin <claire@example.fr> a écrit :",
+]
+
+SIGNATURE = "--\nEmil Lambert\nProject Manager | Example Corp\n+31 6 1234 5678\nwww.example.com"
+
+def _paragraphs(rng, n_words, sentences):
+    paragraphs = []
+    words = 0
+    while words < n_words:
+        paragraph = []
+        for _ in range(rng.randint(2, 4)):
+            sentence = rng.choice(sentences)
+            paragraph.append(sentence)
+            words += len(sentence.split())
+        paragraphs.append(" ".join(paragraph))
+        if rng.random() < 0.2:
+            paragraphs.append("\n".join(rng.sample(BULLETS, 3)))
+    return paragraphs
+
+def plain_body(rng, n_words):
+    parts = [rng.choice(GREETINGS)] + _paragraphs(rng, n_words, SENTENCES) + [rng.choice(CLOSINGS)]
+    if rng.random() < 0.5:
+        parts.append(SIGNATURE)
+    return "\n\n".join(parts)
+
+def html_body(rng, n_words):
+    paragraphs = _paragraphs(rng, n_words, SENTENCES)
+    html_paragraphs = []
+    for paragraph in paragraphs:
+        if paragraph.startswith(("-", "*", "1.")):
+            items = "".join(f"<li>{line.lstrip('-*1. ')}</li>" for line in paragraph.split("\n"))
+            html_paragraphs.append(f"<ul>{items}</ul>")
+        else:
+            html_paragraphs.append(f"<p style=\"margin:0 0 12px\">{paragraph.replace('&', '&amp;')}</p>")
+    return (
+        "<html><head><style>p { font-family: Arial; }</style></head><body>"
+        f"<div dir=\"ltr\"><p>{rng.choice(GREETINGS)}</p>"
+        + "".join(html_paragraphs)
+        + f"<p>{rng.choice(CLOSINGS).replace(chr(10), '<br>')}</p>"
+        "<div class=\"gmail_signature\">Emil Lambert&nbsp;&#124; Example Corp</div></div>"
+        "</body></html>"
+    )
+
+def quoted_body(rng, n_words):
+    reply = plain_body(rng, max(20, n_words // 2))
+    quoted = plain_body(rng, max(20, n_words // 2))
+    quoted_lines = "\n".join(f"> {line}" for line in quoted.split("\n"))
+    header = "On Sat, May 3, 2025 at 10:15 AM Anna de Vries <anna@example.com> wrote:"
+    return f"{reply}\n\n{header}\n{quoted_lines}"
+
+def multilingual_body(rng, n_words):
+    sentences = SENTENCES + FOREIGN_SENTENCES * 2
+    body = "\n\n".join([rng.choice(GREETINGS)] + _paragraphs(rng, n_words, sentences) + [rng.choice(CLOSINGS)])
+    if rng.random() < 0.5:
+        quoted = "\n".join(f"> {sentence}" for sentence in rng.sample(FOREIGN_SENTENCES, 3))
+        body += f"\n\n{rng.choice(FOREIGN_REPLY_HEADERS)}\n{quoted}"
+    return body
+
+GENERATORS = {
+    "plain": plain_body,
+    "html": html_body,
+    "quoted": quoted_body,
+    "multilingual": multilingual_body,
+}
+
+def generate_corpus(per_combination=10, kinds=KINDS, sizes=tuple(SIZES), seed=42):
+    """
+    Build a list of synthetic emails.
+
+    Args:
+        per_combination: Emails generated per (kind, size) pair
+        kinds: Body kinds to include
+        sizes: Size names from SIZES to include
+        seed: Random seed; the same arguments always give the same corpus
+
+    Returns:
+        list: Dicts with "kind", "size" and "body"
+    """
+    rng = random.Random(seed)
+    emails = []
+    for kind in kinds:
+        for size in sizes:
+            for _ in range(per_combination):
+                emails.append({"kind": kind, "size": size, "body": GENERATORS[kind](rng, SIZES[size])})
+    return emails
@@ -0,0 +1,86 @@
+"""
+Compare the fast HTML-to-text path with the BeautifulSoup reference.
+
+Runs both conversions over every email body in the stored data_*.json corpora,
+reports bodies whose output differs and the time each path takes. A few
+hand-written line ending and whitespace cases are checked against their
+expected text as well.
+
+html_to_text normalizes CRLF and CR line endings of HTML bodies before
+parsing, which BeautifulSoup does not, so the reference side applies
+normalize_newlines to HTML input before the unchanged BeautifulSoup parse.
+
+Usage: python benchmarks/html_equivalence.py [data_dir]
+"""
+import os
+import sys
+import glob
+import json
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocessing import html_to_text, html_to_text_soup, normalize_newlines, MARKUP_RE
+
+# (html, expected text) pairs both paths must agree on
+EDGE_CASES = [
+    ("<p>1</p>\r\n<p>2</p>", "1\n2"),
+    ("<p>1</p>\r\n\r\n<p>2</p>", "1\n2"),
+    ("<p>1\r\n\r\n2</p>", "1\n\n2"),
+    ("<p>1\r2</p>\r<p>3</p>", "1\n2\n3"),
+    ("<pre>1\r\n\r\n</pre>", "1\n\n"),
+    ("<p>1</p>  <p>2</p>", "1 2"),
+]
+
+def reference_text(body):
+    """BeautifulSoup output html_to_text must reproduce: plain text as is, HTML with line endings normalized"""
+    if not MARKUP_RE.search(body):
+        return body
+    return html_to_text_soup(normalize_newlines(body))
+
+def check_edge_cases():
+    """Return the edge cases either path gets wrong"""
+    return [(html, expected) for html, expected in EDGE_CASES
+            if html_to_text(html) != expected or reference_text(html) != expected]
+
+def load_bodies(data_dir):
+    bodies = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "**", "data_*.json"), recursive=True)):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        bodies.extend(email.get("body", "") for email in data.get("emails", []) if isinstance(email.get("body"), str))
+    return bodies
+
+def time_path(fn, bodies, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in bodies:
+            fn(body)
+    return time.perf_counter() - start
+
+def main(data_dir, repeat=5):
+    bodies = load_bodies(data_dir)
+    if not bodies:
+        print(f"No email bodies found under {data_dir}")
+        return 1
+
+    mismatches = [i for i, body in enumerate(bodies) if html_to_text(body) != reference_text(body)]
+    markup_count = sum(1 for body in bodies if MARKUP_RE.search(body))
+
+    soup_time = time_path(html_to_text_soup, bodies, repeat)
+    fast_time = time_path(html_to_text, bodies, repeat)
+
+    print(f"Bodies: {len(bodies)} ({markup_count} with markup, {len(bodies) - markup_count} plain text)")
+    print(f"Output mismatches: {len(mismatches)}")
+    for i in mismatches[:10]:
+        print(f"  body #{i}: fast={html_to_text(bodies[i])[:60]!r} soup={reference_text(bodies[i])[:60]!r}")
+    failed_cases = check_edge_cases()
+    print(f"Edge case failures: {len(failed_cases)} of {len(EDGE_CASES)}")
+    for html, expected in failed_cases:
+        print(f"  {html!r}: expected={expected!r} fast={html_to_text(html)!r} soup={reference_text(html)!r}")
+    print(f"BeautifulSoup: {soup_time / repeat * 1000:.1f} ms per pass")
+    print(f"Fast path:     {fast_time / repeat * 1000:.1f} ms per pass ({soup_time / fast_time:.1f}x)")
+    return 1 if mismatches or failed_cases else 0
+
+if __name__ == "__main__":
+    default_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "user")
+    sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else default_dir))
@@ -0,0 +1,193 @@
+"""
+Benchmark the analysis pipeline stage by stage on a synthetic corpus.
+
+Times preprocess_email, extract_email_features (single and batched),
+classify_tone_axes (single and batched), aggregate_user_profile,
+generate_cluster_visualization and validate_style_match separately,
+reporting latency percentiles, throughput and peak traced memory. Results are written as JSON under
+benchmarks/results so runs on different commits can be compared.
+
+Usage: python benchmarks/pipeline.py [--per-combination N] [--repeat N]
+                                     [--stages a,b] [--compare results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from benchmarks.corpus import generate_corpus, KINDS, SIZES
+
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+STAGES = ("preprocess", "extract", "extract_batch", "classify", "classify_batch", "aggregate", "visualize", "validate")
+
+def _summary(durations, items):
+    """Latency and throughput for one stage; durations are seconds per call"""
+    total = sum(durations)
+    ordered = sorted(durations)
+    return {
+        "calls": len(durations),
+        "items": items,
+        "total_s": round(total, 4),
+        "mean_ms": round(total / len(durations) * 1000, 3),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "items_per_s": round(items / total, 1) if total else None,
+    }
+
+def _timed(fn, args_list, repeat):
+    durations = []
+    for _ in range(repeat):
+        for args in args_list:
+            start = time.perf_counter()
+            fn(*args)
+            durations.append(time.perf_counter() - start)
+    return durations
+
+def _peak_memory(fn, args_list):
+    """Peak traced allocation (MB) for one pass; measured separately because tracing slows everything down"""
+    tracemalloc.start()
+    try:
+        for args in args_list:
+            fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2)
+
+def run_stage(fn, args_list, repeat, items_per_call=1, by_kind=None):
+    """
+    Time fn over args_list and measure its memory.
+
+    Args:
+        fn: Callable under test
+        args_list: Argument tuples, one per call
+        repeat: Timed passes over args_list (after one warm-up call)
+        items_per_call: Emails processed per call, for throughput
+        by_kind: Optional kind label per call for a per-kind breakdown
+
+    Returns:
+        dict: Stage results
+    """
+    fn(*args_list[0])
+    durations = _timed(fn, args_list, repeat)
+    result = _summary(durations, len(durations) * items_per_call)
+    result["peak_traced_mb"] = _peak_memory(fn, args_list)
+    if by_kind:
+        kinds = by_kind * repeat
+        result["by_kind"] = {
+            kind: _summary([d for d, k in zip(durations, kinds) if k == kind], kinds.count(kind))
+            for kind in dict.fromkeys(by_kind)
+        }
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def run(per_combination=5, repeat=3, stages=STAGES, seed=42, validate_count=20):
+    from preprocessing import preprocess_email
+    from feature_extraction import extract_email_features, extract_email_features_batch
+    from tone_classification import classify_tone_axes, classify_tone_axes_batch, feature_columns
+    from profile_aggregation import aggregate_user_profile
+    from visualization import generate_cluster_visualization
+    from style_validator import validate_style_match
+
+    corpus = generate_corpus(per_combination=per_combination, seed=seed)
+    bodies = [email["body"] for email in corpus]
+    kinds = [email["kind"] for email in corpus]
+    features_list = [extract_email_features(body) for body in bodies]
+    tone_axes_list = [classify_tone_axes(features) for features in features_list]
+    profile = aggregate_user_profile(tone_axes_list)
+
+    results = {}
+    timers = {
+        "preprocess": lambda: run_stage(preprocess_email, [(b,) for b in bodies], repeat, by_kind=kinds),
+        "extract": lambda: run_stage(extract_email_features, [(b,) for b in bodies], repeat, by_kind=kinds),
+        "extract_batch": lambda: run_stage(extract_email_features_batch, [(bodies,)], repeat,
+                                           items_per_call=len(bodies)),
+        "classify": lambda: run_stage(classify_tone_axes, [(f,) for f in features_list], repeat),
+        "classify_batch": lambda: run_stage(classify_tone_axes_batch, [(feature_columns(features_list),)], repeat,
+                                            items_per_call=len(features_list)),
+        "aggregate": lambda: run_stage(aggregate_user_profile, [(tone_axes_list,)], repeat,
+                                       items_per_call=len(tone_axes_list)),
+        "validate": lambda: run_stage(validate_style_match, [(profile, b) for b in bodies[:validate_count]], repeat),
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        timers["visualize"] = lambda: run_stage(
+            generate_cluster_visualization, [(tmp_dir, tone_axes_list, "bench", "bench")], repeat,
+            items_per_call=len(tone_axes_list))
+        for stage in stages:
+            print(f"Running {stage}...", flush=True)
+            results[stage] = timers[stage]()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": {"emails": len(corpus), "per_combination": per_combination, "kinds": list(KINDS),
+                       "sizes": SIZES, "seed": seed},
+            "repeat": repeat,
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        "stages": results,
+    }
+
+def print_report(report, baseline=None):
+    print(f"\nCommit {report['meta']['commit']}, {report['meta']['corpus']['emails']} emails, "
+          f"max RSS {report['meta']['max_rss_mb']} MB")
+    print(f"{'stage':<15}{'mean ms':>10}{'p95 ms':>10}{'items/s':>11}{'peak MB':>9}{'vs base':>9}")
+    for stage, result in report["stages"].items():
+        delta = ""
+        if baseline and stage in baseline.get("stages", {}):
+            base = baseline["stages"][stage]["mean_ms"]
+            delta = f"{result['mean_ms'] / base:.2f}x" if base else ""
+        print(f"{stage:<15}{result['mean_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['items_per_s'] or 0:>11.1f}{result['peak_traced_mb']:>9.2f}{delta:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--per-combination", type=int, default=5, help="emails per (kind, size) pair")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes per stage")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of " + ",".join(STAGES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--out", default=RESULTS_DIR, help="directory for the results JSON")
+    args = parser.parse_args()
+
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    report = run(per_combination=args.per_combination, repeat=args.repeat, stages=stages, seed=args.seed)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    os.makedirs(args.out, exist_ok=True)
+    out_path = os.path.join(args.out, f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{report['meta']['commit']}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {out_path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
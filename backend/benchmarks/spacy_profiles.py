@@ -0,0 +1,153 @@
+"""
+Compare the spaCy pipeline profiles against "full" on a reference corpus.
+
+For every profile in feature_extraction.SPACY_PROFILES, extracts features
+for the stored data_*.json emails plus the synthetic benchmark corpus,
+classifies their tone axes and reports throughput, per-axis agreement
+with "full" and how often the parser-dependent features (sentence count,
+passive voice, noun chunks) match. The report is written as Markdown so it
+can be committed next to the code it describes.
+
+Usage: python benchmarks/spacy_profiles.py [--data-dir DIR] [--per-combination N]
+                                           [--repeat N] [--out report.md]
+"""
+import os
+import sys
+import time
+import argparse
+import platform
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+from benchmarks.corpus import generate_corpus
+from benchmarks.html_equivalence import load_bodies
+from benchmarks.pipeline import git_commit
+
+DEFAULT_REPORT = os.path.join(BACKEND_DIR, "benchmarks", "spacy_profiles.md")
+
+# Features whose values depend on the parser
+PARSER_FEATURES = ("sentence_count", "avg_sentence_length", "passive_count", "common_phrases")
+
+def reference_corpus(data_dir, per_combination, seed=42):
+    bodies = [body for body in load_bodies(data_dir) if body.strip()]
+    bodies += [email["body"] for email in generate_corpus(per_combination=per_combination, seed=seed)]
+    return bodies
+
+def run_profile(profile, bodies, repeat):
+    """
+    Extract and classify the corpus with one profile.
+
+    Returns:
+        dict: load time, extraction throughput, features and tone axes per email
+    """
+    import feature_extraction
+    from tone_classification import classify_tone_axes
+
+    started = time.perf_counter()
+    feature_extraction.nlp = feature_extraction.load_pipeline(profile)
+    load_seconds = time.perf_counter() - started
+
+    feature_extraction.extract_email_features_batch(bodies[:10], return_exceptions=True)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        features_list = feature_extraction.extract_email_features_batch(bodies, return_exceptions=True)
+    elapsed = (time.perf_counter() - started) / repeat
+
+    features_list = [features if isinstance(features, dict) else {} for features in features_list]
+    return {
+        "pipe_names": list(feature_extraction.nlp.pipe_names),
+        "load_seconds": load_seconds,
+        "emails_per_second": len(bodies) / elapsed if elapsed else None,
+        "features": features_list,
+        "tone_axes": [classify_tone_axes(features) if features else {} for features in features_list],
+    }
+
+def agreement(pairs):
+    """Share of (reference, candidate) pairs that are equal, ignoring emails either run failed on"""
+    pairs = [(a, b) for a, b in pairs if a is not None and b is not None]
+    return sum(1 for a, b in pairs if a == b) / len(pairs) if pairs else None
+
+def compare(reference, candidate):
+    from tone_classification import TONE_AXES
+
+    both = [(ref_axes, axes) for ref_axes, axes in zip(reference["tone_axes"], candidate["tone_axes"])
+            if ref_axes and axes]
+    axis_agreement = {axis: agreement((ref.get(axis), cand.get(axis)) for ref, cand in both) for axis in TONE_AXES}
+    feature_pairs = [(ref, cand) for ref, cand in zip(reference["features"], candidate["features"]) if ref and cand]
+    feature_agreement = {name: agreement((ref.get(name), cand.get(name)) for ref, cand in feature_pairs)
+                         for name in PARSER_FEATURES}
+    return {
+        "all_axes": agreement((ref, cand) for ref, cand in both),
+        "axes": axis_agreement,
+        "features": feature_agreement,
+    }
+
+def _percent(value):
+    return "n/a" if value is None else f"{value * 100:.1f}%"
+
+def render_report(results, comparisons, bodies, repeat):
+    import spacy
+    from feature_extraction import SPACY_MODEL
+
+    full_rate = results["full"]["emails_per_second"]
+    lines = [
+        "# spaCy pipeline profiles",
+        "",
+        f"Generated {datetime.now().isoformat(timespec='seconds')} by `benchmarks/spacy_profiles.py` at commit "
+        f"{git_commit()}: {SPACY_MODEL} {spacy.util.get_package_version(SPACY_MODEL) or 'unknown'}, spaCy {spacy.__version__}, "
+        f"Python {platform.python_version()} on {platform.platform()}.",
+        f"Reference corpus: {len(bodies)} emails (stored data_*.json plus the synthetic benchmark corpus), "
+        f"{repeat} timed passes of extract_email_features_batch.",
+        "",
+        "Select a profile with `WRITEWISE_SPACY_PROFILE`.",
+        "",
+        "| profile | components | load s | emails/s | speedup | all axes agree |",
+        "|---|---|---:|---:|---:|---:|",
+    ]
+    for profile, result in results.items():
+        rate = result["emails_per_second"]
+        speedup = f"{rate / full_rate:.2f}x" if rate and full_rate else "n/a"
+        lines.append(f"| {profile} | {', '.join(result['pipe_names'])} | {result['load_seconds']:.2f} | "
+                     f"{rate:.1f} | {speedup} | {_percent(comparisons[profile]['all_axes'])} |")
+
+    axes = list(comparisons["full"]["axes"])
+    lines += ["", "Tone-axis agreement with full:", "",
+              "| profile | " + " | ".join(axes) + " |", "|---|" + "---:|" * len(axes)]
+    for profile, comparison in comparisons.items():
+        lines.append(f"| {profile} | " + " | ".join(_percent(comparison["axes"][axis]) for axis in axes) + " |")
+
+    lines += ["", "Exact agreement of parser-dependent features with full:", "",
+              "| profile | " + " | ".join(PARSER_FEATURES) + " |", "|---|" + "---:|" * len(PARSER_FEATURES)]
+    for profile, comparison in comparisons.items():
+        lines.append(f"| {profile} | "
+                     + " | ".join(_percent(comparison["features"][name]) for name in PARSER_FEATURES) + " |")
+    return "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--data-dir", default=os.path.join(BACKEND_DIR, "data"),
+                        help="directory searched for data_*.json files")
+    parser.add_argument("--per-combination", type=int, default=5, help="synthetic emails per (kind, size) pair")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes per profile")
+    parser.add_argument("--out", default=DEFAULT_REPORT, help="where to write the Markdown report")
+    args = parser.parse_args()
+
+    from feature_extraction import SPACY_PROFILES
+
+    bodies = reference_corpus(args.data_dir, args.per_combination)
+    results = {}
+    for profile in SPACY_PROFILES:
+        print(f"Running {profile}...", flush=True)
+        results[profile] = run_profile(profile, bodies, args.repeat)
+    comparisons = {profile: compare(results["full"], result) for profile, result in results.items()}
+
+    report = render_report(results, comparisons, bodies, args.repeat)
+    print("\n" + report)
+    with open(args.out, "w", encoding="utf-8") as f:
+        f.write(report)
+    print(f"Saved report to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from metrics import cache_lookup
+
+# Maximum number of feature dicts kept in memory
+FEATURE_CACHE_SIZE = int(os.getenv("WRITEWISE_FEATURE_CACHE_SIZE", 5000))
+
+# Set to 0 to keep extracted features in memory only
+FEATURE_DISK_CACHE = os.getenv("WRITEWISE_FEATURE_DISK_CACHE", "1") != "0"
+
+class FeatureCache:
+    """
+    Two-tier cache of extracted features keyed by a hash of the email body.
+
+    The key also covers the feature schema version, so entries written by an
+    older extractor are never served after the features change. The memory
+    tier is a bounded LRU shared by all users; the optional disk tier lives
+    in a per-user directory and survives restarts.
+    """
+
+    def __init__(self, schema_version, max_entries=FEATURE_CACHE_SIZE):
+        self.schema_version = str(schema_version)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, body):
+        """Cache key for an email body under the current schema version"""
+        digest = hashlib.sha256()
+        digest.update(self.schema_version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(body.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def _disk_path(self, disk_dir, key):
+        return os.path.join(disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key, disk_dir=None):
+        """
+        Look up features for a key, falling back to the disk tier.
+
+        Returns:
+            dict or None if the key is not cached
+        """
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                cache_lookup("feature", True)
+                return features
+
+        if disk_dir:
+            path = self._disk_path(disk_dir, key)
+            if os.path.exists(path):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        features = json.load(f)
+                except Exception as e:
+                    logging.warning(f"Ignoring unreadable feature cache entry {os.path.basename(path)}: {e}")
+                else:
+                    self._remember(key, features)
+                    with self._lock:
+                        self.hits += 1
+                    cache_lookup("feature", True)
+                    return features
+
+        with self._lock:
+            self.misses += 1
+        cache_lookup("feature", False)
+        return None
+
+    def put(self, key, features, disk_dir=None):
+        """Store features in memory and, if disk_dir is given, on disk"""
+        self._remember(key, features)
+        if disk_dir:
+            path = self._disk_path(disk_dir, key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(features, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logging.warning(f"Failed to write feature cache entry: {e}")
+
+    def _remember(self, key, features):
+        with self._lock:
+            self._entries[key] = features
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def extract_many(self, bodies, extract_fn, disk_dir=None):
+        """
+        Return features for every body, extracting each unique uncached body once.
+
+        Args:
+            bodies: List of raw email bodies (may contain duplicates)
+            extract_fn: Callable taking a list of bodies and returning one
+                feature dict or exception per body, in order
+            disk_dir: Optional directory for the disk tier
+
+        Returns:
+            list: One feature dict (or exception) per input body, in input order
+        """
+        results = [None] * len(bodies)
+        pending = OrderedDict()  # key -> (body, indices waiting for it)
+        uncacheable = []
+
+        for idx, body in enumerate(bodies):
+            if not isinstance(body, str) or not body.strip():
+                # Invalid input: let the extractor produce its usual error
+                uncacheable.append(idx)
+                continue
+            key = self.key(body)
+            if key in pending:
+                pending[key][1].append(idx)
+                continue
+            features = self.get(key, disk_dir)
+            if features is not None:
+                results[idx] = features
+            else:
+                pending[key] = (body, [idx])
+
+        to_extract = [body for body, _ in pending.values()] + [bodies[idx] for idx in uncacheable]
+        if to_extract:
+            extracted = extract_fn(to_extract)
+            for (key, (_, indices)), features in zip(pending.items(), extracted):
+                if not isinstance(features, Exception):
+                    self.put(key, features, disk_dir)
+                for idx in indices:
+                    results[idx] = features
+            for idx, features in zip(uncacheable, extracted[len(pending):]):
+                results[idx] = features
+
+        logging.info(f"Feature cache: {len(bodies)} emails, {len(pending)} extracted, "
+                     f"{len(bodies) - len(uncacheable) - sum(len(i) for _, i in pending.values())} served from cache")
+        return results
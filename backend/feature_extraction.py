@@ -1,12 +1,37 @@
 import spacy
-from textblob import TextBlob
 from collections import Counter
 import re
 import textstat
 import emoji
 from preprocessing import preprocess_email
+from lexicon import LexiconMatcher
+from feature_schema import SPACY_PROFILE
+from metrics import timed
+from sentiment import doc_sentiment
 
-nlp = spacy.load("en_core_web_sm")
+SPACY_MODEL = "en_core_web_sm"
+
+# Components left out of each pipeline profile; no feature reads named entities
+SPACY_PROFILES = {
+    "full": (),
+    "no-ner": ("ner",),
+}
+
+def load_pipeline(profile=SPACY_PROFILE):
+    """
+    Load the spaCy pipeline for a profile.
+
+    Raises:
+        ValueError: If the profile is unknown
+    """
+    if profile not in SPACY_PROFILES:
+        raise ValueError(f"Unknown spaCy profile: {profile} (expected one of {', '.join(SPACY_PROFILES)})")
+    return spacy.load(SPACY_MODEL, exclude=list(SPACY_PROFILES[profile]))
+
+nlp = load_pipeline()
+
+# Documents per nlp.pipe batch when extracting features for many emails
+DEFAULT_BATCH_SIZE = 50
 
 # Lexicons for emotional tone detection
 POSITIVE_WORDS = ["happy", "great", "excellent", "good", "pleased", "delighted", "excited", 
@@ -16,132 +41,372 @@ NEGATIVE_WORDS = ["disappointed", "unfortunate", "sorry", "unhappy", "bad", "tro
 FRUSTRATION_WORDS = ["disappointed", "frustrated", "annoying", "waste", "ridiculous", 
                     "unacceptable", "failure", "terrible", "awful", "absurd", "incompetent"]
 
-def extract_email_features(email_text):
-    # Input validation
+# Lexicons for politeness, certainty and email framing
+POLITENESS_MARKERS = ["please", "thank you", "thanks", "kind regards", "best regards"]
+HEDGES = ["maybe", "perhaps", "possibly", "I think", "I guess", "I feel", "I believe", "somewhat", "sort of", "kind of"]
+CERTAINTY_WORDS = ["definitely", "certainly", "clearly", "obviously", "undoubtedly", "absolutely"]
+GREETINGS = ["dear", "hello", "hi", "greetings"]
+CLOSINGS = ["regards", "sincerely", "best", "yours", "cheers", "thanks", "thank you"]
+
+# All lexicons compiled once so each email is scanned a single time
+LEXICON_MATCHER = LexiconMatcher({
+    "positive": POSITIVE_WORDS,
+    "negative": NEGATIVE_WORDS,
+    "frustration": FRUSTRATION_WORDS,
+    "politeness": POLITENESS_MARKERS,
+    "hedges": HEDGES,
+    "certainty": CERTAINTY_WORDS,
+    "greetings": GREETINGS,
+    "closings": CLOSINGS,
+})
+
+def _validate_email_text(email_text):
     if not isinstance(email_text, str):
         raise ValueError(f"Input to extract_email_features must be a string, got {type(email_text).__name__}")
     if not email_text.strip():
         raise ValueError("Input to extract_email_features is an empty string.")
+
+def extract_email_features(email_text, feature_set="full"):
+    """
+    Extract style features from one email.
+    
+    Args:
+        email_text: Raw email body
+        feature_set: Name in FEATURE_SETS ("full", "tone_axes_inputs", "validation")
+            or an iterable of feature names; only what those features need is computed
+        
+    Returns:
+        dict: Feature name -> value
+    """
+    # Input validation
+    _validate_email_text(email_text)
+    _feature_plan(feature_set)
     
     try:
         # Clean the email first
-        email_text = preprocess_email(email_text)
-        doc = nlp(email_text)
-        word_count = len([token.text for token in doc])
-        sentence_count = len(list(doc.sents))
-        common_words = Counter([token.text.lower() for token in doc if token.is_alpha])
-        common_phrases = [chunk.text for chunk in doc.noun_chunks]
-        pos_counts = Counter([token.pos_ for token in doc])
-
-        blob = TextBlob(email_text)
-        sentiment = blob.sentiment.polarity
-        subjectivity = blob.sentiment.subjectivity
-        exclamation_count = email_text.count("!")
-        question_count = email_text.count("?")
-        avg_sentence_length = word_count / sentence_count if sentence_count > 0 else 0
-        paragraph_count = email_text.count("\n\n")
-
-        politeness_markers = ["please", "thank you", "thanks", "kind regards", "best regards"]
-        politeness_counts = {marker: email_text.lower().count(marker) for marker in politeness_markers}
-        total_politeness = sum(politeness_counts.values())
-
-        contractions_pattern = re.compile(r"\b(?:[A-Za-z]+n['']t|[A-Za-z]+[''](?:m|re|ve|ll|d|s))\b")
-        contraction_count = len(contractions_pattern.findall(email_text))
-
-        # Fix the pronoun counting logic
-        pronouns = {"I": 0, "we": 0, "you": 0, "they": 0}
-        for token in doc:
-            token_lower = token.text.lower()
-            if token_lower == "i":
-                pronouns["I"] += 1
-            elif token_lower in pronouns:
-                pronouns[token_lower] += 1
+        with timed("preprocess"):
+            email_text = preprocess_email(email_text)
+        return _features_from_doc(email_text, feature_set=feature_set)
+    except Exception as e:
+        # Wrap any unexpected error with context
+        raise ValueError(f"Error in feature extraction: {str(e)}") from e
+
+def warm_up():
+    """
+    Extract features from a short sample so lazily loaded resources are loaded now.
+
+    TextBlob's sentiment lexicon, textstat's hyphenation dictionary and
+    spaCy's lookup tables are only read on first use; loading them up front
+    (in a gunicorn master before it forks, or during the background warmup)
+    keeps that cost off the first request.
+    """
+    extract_email_features("Hi Anna,\n\nThank you for the update, it looks great! Could we meet on Friday?\n\nBest regards,\nEmil")
+
+def extract_email_features_batch(texts, batch_size=DEFAULT_BATCH_SIZE, return_exceptions=False, feature_set="full"):
+    """
+    Extract features for many emails, parsing them with a single nlp.pipe call.
+    
+    Args:
+        texts: List of raw email bodies
+        batch_size: Number of documents spaCy parses per batch
+        return_exceptions: If True, an email that fails validation or extraction
+            yields its ValueError in place of a feature dict instead of raising
+        feature_set: Feature set name or iterable of feature names, as for extract_email_features
         
-        total_pronouns = sum(pronouns.values())
-        pronoun_ratios = {k: v / word_count if word_count else 0 for k, v in pronouns.items()}
+    Returns:
+        list: One feature dict (or ValueError) per input text, in input order
+    """
+    _, plan = _feature_plan(feature_set)
+    results = [None] * len(texts)
+    cleaned_texts = []
+    cleaned_indices = []
+    
+    def record_error(idx, error):
+        if not return_exceptions:
+            raise error
+        results[idx] = error
+    
+    for idx, email_text in enumerate(texts):
+        try:
+            _validate_email_text(email_text)
+        except ValueError as e:
+            record_error(idx, e)
+            continue
+        try:
+            with timed("preprocess"):
+                cleaned_texts.append(preprocess_email(email_text))
+            cleaned_indices.append(idx)
+        except Exception as e:
+            record_error(idx, ValueError(f"Error in feature extraction: {str(e)}"))
+    
+    docs = nlp.pipe(cleaned_texts, batch_size=batch_size) if "doc" in plan else None
+    for idx, email_text in zip(cleaned_indices, cleaned_texts):
+        doc = None
+        if docs is not None:
+            # nlp.pipe parses a whole batch on the first next(), so per-email times are uneven but sum correctly
+            with timed("spacy_parse"):
+                doc = next(docs)
+        try:
+            results[idx] = _features_from_doc(email_text, doc, feature_set)
+        except Exception as e:
+            record_error(idx, ValueError(f"Error in feature extraction: {str(e)}"))
+    
+    return results
 
-        hedges = ["maybe", "perhaps", "possibly", "I think", "I guess", "I feel", "I believe", "somewhat", "sort of", "kind of"]
-        certainty = ["definitely", "certainly", "clearly", "obviously", "undoubtedly", "absolutely"]
-        hedge_count = sum(email_text.lower().count(h) for h in hedges)
-        certainty_count = sum(email_text.lower().count(c) for c in certainty)
+# Feature graph: name -> (names it is computed from, function of those values).
+# "text" (the preprocessed email) and "doc" (its spaCy parse) are the inputs;
+# names starting with "_" are intermediate results shared by several features.
+FEATURE_GRAPH = {}
 
-        modal_verbs = ["can", "could", "may", "might", "must", "shall", "should", "will", "would"]
-        modal_count = sum(1 for token in doc if token.lemma_ in modal_verbs and token.pos_ == "VERB")
+def _feature(name, *requires):
+    def register(fn):
+        FEATURE_GRAPH[name] = (requires, fn)
+        return fn
+    return register
 
-        passive_count = sum(1 for token in doc if token.dep_ == "auxpass")
+@_feature("doc", "text")
+def _parse(email_text):
+    with timed("spacy_parse"):
+        return nlp(email_text)
 
-        greetings = ["dear", "hello", "hi", "greetings"]
-        closings = ["regards", "sincerely", "best", "yours", "cheers", "thanks", "thank you"]
-        greeting_found = any(email_text.lower().startswith(g) for g in greetings)
-        closing_found = any(closing in email_text.lower()[-100:] for closing in closings)
+@_feature("word_count", "doc")
+def _word_count(doc):
+    return len(doc)
 
-        try:
-            flesch = textstat.flesch_reading_ease(email_text)
-            flesch_kincaid = textstat.flesch_kincaid_grade(email_text)
-        except Exception:
-            flesch = flesch_kincaid = None
+@_feature("sentence_count", "doc")
+def _sentence_count(doc):
+    return len(list(doc.sents))
 
-        emoticon_pattern = re.compile(r"[:;=8][\-o\*']?([\)\]\(\[dDpP/\\:}{@|])")
-        emoticon_count = len(emoticon_pattern.findall(email_text))
-        emoji_count = len([c for c in email_text if c in emoji.EMOJI_DATA])
+@_feature("common_words", "doc")
+def _common_words(doc):
+    return Counter([token.text.lower() for token in doc if token.is_alpha]).most_common(10)
 
-        bullet_points = len(re.findall(r"^\s*[-*•]\s+", email_text, re.MULTILINE))
-        line_breaks = email_text.count("\n")
-        
-        # Enhanced emotion detection
-        email_lower = email_text.lower()
-        positive_word_count = sum(email_lower.count(word) for word in POSITIVE_WORDS)
-        negative_word_count = sum(email_lower.count(word) for word in NEGATIVE_WORDS)
-        frustration_word_count = sum(email_lower.count(word) for word in FRUSTRATION_WORDS)
-        
-        # Calculate a frustration score
-        frustration_score = (frustration_word_count * 2) + (exclamation_count * 0.5) 
-        frustration_score += -sentiment * 2 if sentiment < 0 else 0  # Negative sentiment increases score
-        
-        # Calculate emotional tone
-        if frustration_score > 3:
-            emotional_tone = "frustrated"
-        elif sentiment > 0.2 and positive_word_count > 0:
-            emotional_tone = "positive"
-        elif sentiment < -0.2 and negative_word_count > 0:
-            emotional_tone = "negative"
-        else:
-            emotional_tone = "neutral"
-
-        features = {
-            "word_count": word_count,
-            "sentence_count": sentence_count,
-            "common_words": common_words.most_common(10),
-            "common_phrases": common_phrases[:10],
-            "pos_counts": dict(pos_counts),
-            "sentiment": sentiment,
-            "subjectivity": subjectivity,
-            "exclamation_count": exclamation_count,
-            "question_count": question_count,
-            "avg_sentence_length": avg_sentence_length,
-            "paragraph_count": paragraph_count,
-            "politeness_counts": politeness_counts,
-            "contraction_count": contraction_count,
-            "pronoun_ratios": pronoun_ratios,
-            "hedge_count": hedge_count,
-            "certainty_count": certainty_count,
-            "modal_count": modal_count,
-            "passive_count": passive_count,
-            "greeting_found": greeting_found,
-            "closing_found": closing_found,
-            "flesch_reading_ease": flesch,
-            "flesch_kincaid_grade": flesch_kincaid,
-            "emoticon_count": emoticon_count,
-            "emoji_count": emoji_count,
-            "bullet_points": bullet_points,
-            "line_breaks": line_breaks,
-            "positive_word_count": positive_word_count,
-            "negative_word_count": negative_word_count,
-            "frustration_word_count": frustration_word_count,
-            "frustration_score": frustration_score,
-            "emotional_tone": emotional_tone
-        }
-        return features
-    except Exception as e:
-        # Wrap any unexpected error with context
-        raise ValueError(f"Error in feature extraction: {str(e)}") from e
\ No newline at end of file
+@_feature("common_phrases", "doc")
+def _common_phrases(doc):
+    return [chunk.text for chunk in doc.noun_chunks][:10]
+
+@_feature("pos_counts", "doc")
+def _pos_counts(doc):
+    return dict(Counter([token.pos_ for token in doc]))
+
+@_feature("_sentiment", "doc")
+def _sentiment(doc):
+    with timed("sentiment"):
+        return doc_sentiment(doc)
+
+@_feature("sentiment", "_sentiment")
+def _polarity(scores):
+    return scores[0]
+
+@_feature("subjectivity", "_sentiment")
+def _subjectivity(scores):
+    return scores[1]
+
+@_feature("exclamation_count", "text")
+def _exclamation_count(email_text):
+    return email_text.count("!")
+
+@_feature("question_count", "text")
+def _question_count(email_text):
+    return email_text.count("?")
+
+@_feature("avg_sentence_length", "word_count", "sentence_count")
+def _avg_sentence_length(word_count, sentence_count):
+    return word_count / sentence_count if sentence_count > 0 else 0
+
+@_feature("paragraph_count", "text")
+def _paragraph_count(email_text):
+    return email_text.count("\n\n")
+
+@_feature("_lexicon_hits", "text")
+def _lexicon_hits(email_text):
+    return LEXICON_MATCHER.scan(email_text)
+
+@_feature("politeness_counts", "_lexicon_hits")
+def _politeness_counts(lexicon_hits):
+    politeness_hits = lexicon_hits["politeness"].counts
+    return {marker: politeness_hits[marker] for marker in POLITENESS_MARKERS}
+
+CONTRACTIONS_PATTERN = re.compile(r"\b(?:[A-Za-z]+n['']t|[A-Za-z]+[''](?:m|re|ve|ll|d|s))\b")
+
+@_feature("contraction_count", "text")
+def _contraction_count(email_text):
+    return len(CONTRACTIONS_PATTERN.findall(email_text))
+
+@_feature("pronoun_ratios", "doc", "word_count")
+def _pronoun_ratios(doc, word_count):
+    pronouns = {"I": 0, "we": 0, "you": 0, "they": 0}
+    for token in doc:
+        token_lower = token.text.lower()
+        if token_lower == "i":
+            pronouns["I"] += 1
+        elif token_lower in pronouns:
+            pronouns[token_lower] += 1
+    return {k: v / word_count if word_count else 0 for k, v in pronouns.items()}
+
+@_feature("hedge_count", "_lexicon_hits")
+def _hedge_count(lexicon_hits):
+    return lexicon_hits["hedges"].total
+
+@_feature("certainty_count", "_lexicon_hits")
+def _certainty_count(lexicon_hits):
+    return lexicon_hits["certainty"].total
+
+MODAL_VERBS = ["can", "could", "may", "might", "must", "shall", "should", "will", "would"]
+
+@_feature("modal_count", "doc")
+def _modal_count(doc):
+    return sum(1 for token in doc if token.lemma_ in MODAL_VERBS and token.pos_ == "VERB")
+
+@_feature("passive_count", "doc")
+def _passive_count(doc):
+    return sum(1 for token in doc if token.dep_ == "auxpass")
+
+# Greeting must open the email; closing must start within the last 100 characters
+@_feature("greeting_found", "_lexicon_hits")
+def _greeting_found(lexicon_hits):
+    return lexicon_hits["greetings"].first_start == 0
+
+@_feature("closing_found", "text", "_lexicon_hits")
+def _closing_found(email_text, lexicon_hits):
+    closing_start = lexicon_hits["closings"].last_start
+    return closing_start is not None and closing_start >= len(email_text.lower()) - 100
+
+@_feature("_readability", "text")
+def _readability(email_text):
+    try:
+        with timed("textstat"):
+            return textstat.flesch_reading_ease(email_text), textstat.flesch_kincaid_grade(email_text)
+    except Exception:
+        return None, None
+
+@_feature("flesch_reading_ease", "_readability")
+def _flesch_reading_ease(scores):
+    return scores[0]
+
+@_feature("flesch_kincaid_grade", "_readability")
+def _flesch_kincaid_grade(scores):
+    return scores[1]
+
+EMOTICON_PATTERN = re.compile(r"[:;=8][\-o\*']?([\)\]\(\[dDpP/\\:}{@|])")
+
+@_feature("emoticon_count", "text")
+def _emoticon_count(email_text):
+    return len(EMOTICON_PATTERN.findall(email_text))
+
+@_feature("emoji_count", "text")
+def _emoji_count(email_text):
+    return len([c for c in email_text if c in emoji.EMOJI_DATA])
+
+@_feature("bullet_points", "text")
+def _bullet_points(email_text):
+    return len(re.findall(r"^\s*[-*•]\s+", email_text, re.MULTILINE))
+
+@_feature("line_breaks", "text")
+def _line_breaks(email_text):
+    return email_text.count("\n")
+
+@_feature("positive_word_count", "_lexicon_hits")
+def _positive_word_count(lexicon_hits):
+    return lexicon_hits["positive"].total
+
+@_feature("negative_word_count", "_lexicon_hits")
+def _negative_word_count(lexicon_hits):
+    return lexicon_hits["negative"].total
+
+@_feature("frustration_word_count", "_lexicon_hits")
+def _frustration_word_count(lexicon_hits):
+    return lexicon_hits["frustration"].total
+
+@_feature("frustration_score", "frustration_word_count", "exclamation_count", "sentiment")
+def _frustration_score(frustration_word_count, exclamation_count, sentiment):
+    frustration_score = (frustration_word_count * 2) + (exclamation_count * 0.5)
+    frustration_score += -sentiment * 2 if sentiment < 0 else 0  # Negative sentiment increases score
+    return frustration_score
+
+@_feature("emotional_tone", "frustration_score", "sentiment", "positive_word_count", "negative_word_count")
+def _emotional_tone(frustration_score, sentiment, positive_word_count, negative_word_count):
+    if frustration_score > 3:
+        return "frustrated"
+    elif sentiment > 0.2 and positive_word_count > 0:
+        return "positive"
+    elif sentiment < -0.2 and negative_word_count > 0:
+        return "negative"
+    return "neutral"
+
+# Named feature sets; results list features in this order
+FEATURE_SETS = {
+    "full": (
+        "word_count", "sentence_count", "common_words", "common_phrases", "pos_counts",
+        "sentiment", "subjectivity", "exclamation_count", "question_count", "avg_sentence_length",
+        "paragraph_count", "politeness_counts", "contraction_count", "pronoun_ratios", "hedge_count",
+        "certainty_count", "modal_count", "passive_count", "greeting_found", "closing_found",
+        "flesch_reading_ease", "flesch_kincaid_grade", "emoticon_count", "emoji_count", "bullet_points",
+        "line_breaks", "positive_word_count", "negative_word_count", "frustration_word_count",
+        "frustration_score", "emotional_tone",
+    ),
+    # Everything classify_tone_axes reads
+    "tone_axes_inputs": (
+        "sentiment", "subjectivity", "exclamation_count", "avg_sentence_length", "politeness_counts",
+        "contraction_count", "pronoun_ratios", "hedge_count", "certainty_count", "modal_count",
+        "passive_count", "greeting_found", "closing_found", "flesch_kincaid_grade", "emoticon_count",
+        "emoji_count",
+    ),
+}
+# Style validation of generated emails compares tone axes only
+FEATURE_SETS["validation"] = FEATURE_SETS["tone_axes_inputs"]
+
+_plans = {}
+
+def _feature_plan(feature_set):
+    """
+    Features to return and every graph node to evaluate for them, in dependency order.
+
+    Args:
+        feature_set: Name in FEATURE_SETS or an iterable of feature names
+
+    Raises:
+        ValueError: If the set or one of its features is unknown
+    """
+    key = feature_set if isinstance(feature_set, str) else tuple(feature_set)
+    plan = _plans.get(key)
+    if plan is not None:
+        return plan
+    if isinstance(feature_set, str):
+        if feature_set not in FEATURE_SETS:
+            raise ValueError(f"Unknown feature set: {feature_set}")
+        names = FEATURE_SETS[feature_set]
+    else:
+        names = key
+    unknown = [name for name in names if name not in FEATURE_GRAPH or name.startswith("_") or name == "doc"]
+    if unknown:
+        raise ValueError(f"Unknown features: {', '.join(unknown)}")
+
+    order = []
+    def visit(name):
+        if name == "text" or name in order:
+            return
+        for required in FEATURE_GRAPH[name][0]:
+            visit(required)
+        order.append(name)
+    for name in names:
+        visit(name)
+    plan = _plans[key] = (tuple(names), tuple(order))
+    return plan
+
+def _features_from_doc(email_text, doc=None, feature_set="full"):
+    """
+    Compute a feature set for an already preprocessed email.
+
+    Only the graph nodes the requested features depend on are evaluated;
+    the email is parsed here if doc is not given and a feature needs it.
+    """
+    names, order = _feature_plan(feature_set)
+    values = {"text": email_text}
+    if doc is not None:
+        values["doc"] = doc
+    for node in order:
+        if node not in values:
+            requires, fn = FEATURE_GRAPH[node]
+            values[node] = fn(*[values[required] for required in requires])
+    return {name: values[name] for name in names}
@@ -0,0 +1,110 @@
+import os
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import metrics
+
+# Number of worker processes used for feature extraction (1 disables the pool)
+FEATURE_WORKERS = int(os.getenv("WRITEWISE_FEATURE_WORKERS", os.cpu_count() or 1))
+
+# Below this many emails the work stays in-process; pool overhead outweighs the gain
+MIN_PARALLEL_EMAILS = int(os.getenv("WRITEWISE_MIN_PARALLEL_EMAILS", 16))
+
+_pool = None
+_pool_warmup = []
+_pool_lock = threading.Lock()
+
+def _init_worker():
+    """Pool initializer: importing feature_extraction loads the spaCy model once per worker"""
+    import feature_extraction  # noqa: F401
+    # Drop series inherited from the parent on fork; workers report only their own deltas
+    metrics.REGISTRY.snapshot(reset=True)
+
+def _warm_worker(_):
+    return os.getpid()
+
+def _extract_chunk(texts):
+    """Worker task: features for a chunk plus the metrics recorded while computing them"""
+    from feature_extraction import extract_email_features_batch
+    results = extract_email_features_batch(texts, return_exceptions=True)
+    return results, metrics.REGISTRY.snapshot(reset=True)
+
+def start_feature_pool(wait=False):
+    """
+    Create the worker pool and start loading the model in every worker.
+
+    Args:
+        wait: Block until all workers have finished loading
+
+    Returns:
+        ProcessPoolExecutor or None if parallel extraction is disabled
+    """
+    global _pool, _pool_warmup
+    with _pool_lock:
+        if _pool is None and FEATURE_WORKERS > 1:
+            _pool = ProcessPoolExecutor(max_workers=FEATURE_WORKERS, initializer=_init_worker)
+            # One task per worker makes the executor spawn (and initialize) all of them now
+            _pool_warmup = [_pool.submit(_warm_worker, i) for i in range(FEATURE_WORKERS)]
+            logging.info(f"Started feature extraction pool with {FEATURE_WORKERS} workers")
+        pool, warmup = _pool, _pool_warmup
+    if wait:
+        for future in warmup:
+            future.result()
+    return pool
+
+def _reset_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def split_chunks(items, n_chunks):
+    """Split a list into at most n_chunks contiguous, similarly sized chunks"""
+    n_chunks = max(1, min(n_chunks, len(items)))
+    size, extra = divmod(len(items), n_chunks)
+    chunks = []
+    start = 0
+    for i in range(n_chunks):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+def extract_features_parallel(texts):
+    """
+    Extract features for many emails, spreading the work across the worker pool.
+
+    Results keep input order, so index i always belongs to texts[i]. An email
+    that fails is returned as its ValueError, like
+    extract_email_features_batch(..., return_exceptions=True).
+
+    Args:
+        texts: List of raw email bodies
+
+    Returns:
+        list: One feature dict (or ValueError) per input text
+    """
+    pool = start_feature_pool() if len(texts) >= MIN_PARALLEL_EMAILS else None
+    if pool is None:
+        from feature_extraction import extract_email_features_batch
+        return extract_email_features_batch(texts, return_exceptions=True)
+
+    chunks = split_chunks(texts, FEATURE_WORKERS)
+    futures = [pool.submit(_extract_chunk, chunk) for chunk in chunks]
+
+    results = []
+    for chunk, future in zip(chunks, futures):
+        try:
+            chunk_results, chunk_metrics = future.result()
+            metrics.REGISTRY.merge(chunk_metrics)
+            results.extend(chunk_results)
+        except BrokenProcessPool as e:
+            logging.error(f"Feature extraction pool broke, it will be restarted: {e}")
+            _reset_pool(pool)
+            results.extend(ValueError(f"Error in feature extraction: {str(e)}") for _ in chunk)
+        except Exception as e:
+            logging.error(f"Feature extraction chunk of {len(chunk)} emails failed: {e}")
+            results.extend(ValueError(f"Error in feature extraction: {str(e)}") for _ in chunk)
+    return results
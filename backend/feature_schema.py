@@ -0,0 +1,8 @@
+import os
+
+# Bump whenever the feature dict changes so cached features are recomputed
+FEATURE_SCHEMA_VERSION = 3
+
+# spaCy pipeline profile used for feature extraction: "full" or "no-ner"
+# (see feature_extraction.SPACY_PROFILES and benchmarks/spacy_profiles.py)
+SPACY_PROFILE = os.getenv("WRITEWISE_SPACY_PROFILE", "full")
@@ -0,0 +1,312 @@
+import os
+import json
+import logging
+import threading
+import numpy as np
+from file_lock import file_lock
+
+# Dict-valued features with a fixed set of numeric keys, stored as one column per key
+FLATTENED_FIELDS = ("politeness_counts", "pronoun_ratios")
+
+STORE_FORMAT_VERSION = 2
+
+def _column_dtype(value):
+    if isinstance(value, (bool, np.bool_)):
+        return "|b1"
+    if isinstance(value, (int, np.integer)):
+        return "<i4"
+    return "<f8"
+
+def _is_number(value):
+    return isinstance(value, (bool, int, float, np.bool_, np.integer, np.floating))
+
+def _infer_dtype(column):
+    """Narrowest column type for a list of values; None (missing) needs a float column for NaN"""
+    numbers = [value for value in column if value is not None]
+    dtypes = {_column_dtype(value) for value in numbers}
+    if "<f8" in dtypes or (len(numbers) < len(column) and dtypes != {"|b1"}):
+        return "<f8"
+    return "<i4" if "<i4" in dtypes else "|b1"
+
+class FeatureStore:
+    """
+    Append-only columnar store of per-email feature dicts.
+
+    Numeric and boolean features are kept as raw little-endian arrays, one
+    file per column, that are read back with np.memmap; dicts listed in
+    FLATTENED_FIELDS become dotted columns ("pronoun_ratios.you"). A numeric
+    feature that is None, or missing from a valid row, is stored as NaN in a
+    float column (an int column is widened on its first None) and read back
+    as None. Everything else (common_words, pos_counts, emotional_tone, ...)
+    goes to an NDJSON sidecar with a row offset index. meta.json records the
+    column types and files, the committed row count and the row range of
+    every batch.
+
+    Appends only add bytes to the end of each file and then replace
+    meta.json, so readers never see a partially written batch: anything past
+    the committed row count is ignored and truncated by the next append.
+    Appends hold a file lock next to the store directory, so server worker
+    processes sharing a store take turns.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Directory holding the store (created on first append)
+        """
+        self.path = path
+        self._meta_path = os.path.join(path, "meta.json")
+
+    def _load_meta(self):
+        if not os.path.exists(self._meta_path):
+            return {"format": STORE_FORMAT_VERSION, "rows": 0, "sidecar_bytes": 0, "columns": {}, "batches": {}}
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_meta(self, meta):
+        tmp_path = f"{self._meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, self._meta_path)
+
+    def _column_path(self, name, meta=None):
+        # A widened column is rewritten to a new file that meta.json points to
+        files = (meta or self._load_meta()).get("files", {})
+        return os.path.join(self.path, files.get(name, f"{name}.col"))
+
+    @property
+    def rows(self):
+        return self._load_meta()["rows"]
+
+    @property
+    def column_names(self):
+        return list(self._load_meta()["columns"])
+
+    def batches(self):
+        """Dict of batch name -> [start, stop) row range, in append order"""
+        return self._load_meta()["batches"]
+
+    @staticmethod
+    def split_record(features):
+        """
+        Split a feature dict into column values and sidecar fields.
+
+        Returns:
+            tuple: (dict of column name -> number, dict of sidecar fields)
+        """
+        columns = {}
+        sidecar = {}
+        for key, value in features.items():
+            if key in FLATTENED_FIELDS and isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    columns[f"{key}.{sub_key}"] = sub_value
+            elif value is None or _is_number(value):
+                columns[key] = value
+            else:
+                sidecar[key] = value
+        return columns, sidecar
+
+    def append(self, features_list, batch):
+        """
+        Append feature dicts as a batch; empty dicts are stored as invalid rows.
+
+        Appending to an existing batch name extends its row range.
+
+        Args:
+            features_list: List of feature dicts (one per email)
+            batch: Batch name, e.g. the analysis timestamp
+
+        Returns:
+            tuple: (start, stop) rows written
+        """
+        if not features_list:
+            rows = self.rows
+            return rows, rows
+        os.makedirs(self.path, exist_ok=True)
+        with file_lock(self.path):
+            meta = self._load_meta()
+            start = meta["rows"]
+            split = [self.split_record(features) for features in features_list]
+
+            columns = meta["columns"]
+            valid = [bool(features) for features in features_list]
+            present = {name: [] for name in columns if name != "valid"}
+            for (row_columns, _), is_valid in zip(split, valid):
+                for name, value in row_columns.items():
+                    present.setdefault(name, []).append(value)
+            obsolete = []
+            values = {}
+            for name, column in present.items():
+                # A column missing from a valid row is missing data, like None
+                if any(is_valid and name not in row_columns for (row_columns, _), is_valid in zip(split, valid)):
+                    column = column + [None]
+                obsolete += self._ensure_column(meta, name, column)
+                missing = np.nan if columns[name] == "<f8" else 0
+                values[name] = [
+                    (missing if row_columns.get(name) is None else row_columns[name]) if is_valid else 0
+                    for (row_columns, _), is_valid in zip(split, valid)
+                ]
+            values["valid"] = valid
+            obsolete += self._ensure_column(meta, "valid", valid, dtype="|b1")
+
+            # Drop anything past the committed row count left by an interrupted append
+            for name, dtype in columns.items():
+                column_path = self._column_path(name, meta)
+                itemsize = np.dtype(dtype).itemsize
+                with open(column_path, "ab") as f:
+                    f.truncate(start * itemsize)
+                    f.write(np.asarray(values[name], dtype=dtype).tobytes())
+
+            offsets = []
+            sidecar_bytes = meta["sidecar_bytes"]
+            with open(os.path.join(self.path, "sidecar.ndjson"), "ab") as f:
+                f.truncate(sidecar_bytes)
+                for _, row_sidecar in split:
+                    line = (json.dumps(row_sidecar, ensure_ascii=False) + "\n").encode("utf-8")
+                    offsets.append(sidecar_bytes)
+                    sidecar_bytes += len(line)
+                    f.write(line)
+            with open(os.path.join(self.path, "sidecar.idx"), "ab") as f:
+                f.truncate(start * 8)
+                f.write(np.asarray(offsets, dtype="<i8").tobytes())
+
+            stop = start + len(features_list)
+            batch = str(batch)
+            batch_range = meta["batches"].get(batch)
+            if batch_range and batch_range[1] == start:
+                batch_range[1] = stop
+            else:
+                if batch_range:
+                    logging.warning(f"Feature store batch {batch} is not contiguous; keeping the latest rows")
+                meta["batches"][batch] = [start, stop]
+            meta["rows"] = stop
+            meta["sidecar_bytes"] = sidecar_bytes
+            self._save_meta(meta)
+            # Files replaced by widened columns are unreferenced only once meta.json is saved
+            for path in obsolete:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return start, stop
+
+    def _ensure_column(self, meta, name, column, dtype=None):
+        """
+        Create a missing column or widen an existing one so it can hold column's values.
+
+        New columns are filled for existing rows with NaN (float) or zero.
+        A widened column is written to a new file and only recorded in meta,
+        which the caller saves after the append, so a crash at any point
+        leaves meta.json describing files that match it.
+
+        Returns:
+            list: Paths no longer referenced once meta.json is saved
+        """
+        columns = meta["columns"]
+        if dtype is None:
+            dtype = _infer_dtype(column)
+        current = columns.get(name)
+        if current is None:
+            columns[name] = dtype
+            fill = np.full(meta["rows"], np.nan) if dtype == "<f8" else np.zeros(meta["rows"], dtype=dtype)
+            with open(self._column_path(name, meta), "wb") as f:
+                f.write(fill.astype(dtype).tobytes())
+            return []
+        if current == dtype or current == "<f8" or dtype == "|b1":
+            return []
+        # Rare type change: rewrite this one column with the wider type
+        old_path = self._column_path(name, meta)
+        existing = np.fromfile(old_path, dtype=current, count=meta["rows"])
+        new_file = f"{name}.{dtype[1:]}.col"
+        tmp_path = os.path.join(self.path, f"{new_file}.tmp")
+        existing.astype(dtype).tofile(tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, new_file))
+        columns[name] = dtype
+        meta.setdefault("files", {})[name] = new_file
+        return [old_path]
+
+    def column(self, name, start=0, stop=None):
+        """
+        Memory-mapped, read-only view of one column.
+
+        Returns:
+            np.ndarray: Values for rows [start, stop)
+        """
+        meta = self._load_meta()
+        dtype = meta["columns"].get(name)
+        if dtype is None:
+            raise KeyError(f"Unknown feature column: {name}")
+        rows = meta["rows"]
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        data = np.memmap(self._column_path(name, meta), dtype=dtype, mode="r", shape=(rows,))
+        return data[start:stop]
+
+    def columns(self, names=None, start=0, stop=None):
+        """Dict of column name -> memory-mapped array for rows [start, stop)"""
+        if names is None:
+            names = self.column_names
+        return {name: self.column(name, start, stop) for name in names}
+
+    def batch_columns(self, batch, names=None):
+        """Columns for the rows of one batch"""
+        start, stop = self.batches()[str(batch)]
+        return self.columns(names, start, stop)
+
+    def sidecar(self, start=0, stop=None):
+        """
+        Variable-length fields for rows [start, stop), read through the offset index.
+
+        Returns:
+            list: One dict per row
+        """
+        meta = self._load_meta()
+        rows = meta["rows"]
+        stop = rows if stop is None else min(stop, rows)
+        if start >= stop:
+            return []
+        offsets = np.memmap(os.path.join(self.path, "sidecar.idx"), dtype="<i8", mode="r", shape=(rows,))
+        begin = int(offsets[start])
+        end = int(offsets[stop]) if stop < rows else meta["sidecar_bytes"]
+        with open(os.path.join(self.path, "sidecar.ndjson"), "rb") as f:
+            f.seek(begin)
+            chunk = f.read(end - begin)
+        return [json.loads(line) for line in chunk.decode("utf-8").splitlines()]
+
+    def records(self, start=0, stop=None):
+        """
+        Rebuild the original feature dicts for rows [start, stop).
+
+        Invalid rows (emails that failed extraction) come back as empty dicts.
+        """
+        meta = self._load_meta()
+        columns = self.columns(list(meta["columns"]), start, stop)
+        valid = columns.pop("valid")
+        sidecar = self.sidecar(start, stop)
+        records = []
+        for i, row_sidecar in enumerate(sidecar):
+            if not valid[i]:
+                records.append({})
+                continue
+            record = {}
+            for name, data in columns.items():
+                value = data[i].item()
+                if value != value:  # NaN marks a missing value
+                    value = None
+                field, _, sub_key = name.partition(".")
+                if sub_key:
+                    record.setdefault(field, {})[sub_key] = value
+                else:
+                    record[name] = value
+            record.update(row_sidecar)
+            records.append(record)
+        return records
+
+    def batch_records(self, batch):
+        """Feature dicts of one batch"""
+        start, stop = self.batches()[str(batch)]
+        return self.records(start, stop)
+
+def feature_store_path(user_dir):
+    """Location of a user's feature store"""
+    return os.path.join(user_dir, "analysis", "features")
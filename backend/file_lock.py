@@ -0,0 +1,21 @@
+import fcntl
+from contextlib import contextmanager
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive lock on "<path>.lock", shared by every server process and thread.
+
+    Use it around read-modify-write cycles of files that gunicorn workers
+    update concurrently. flock locks belong to the open file, so threads of
+    one process that each open the lock file exclude each other as well.
+
+    Args:
+        path: File (or directory) being protected; its parent must exist
+    """
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,28 @@
+import os
+
+# Address to listen on
+bind = os.getenv("WRITEWISE_BIND", "0.0.0.0:27481")
+
+# Worker processes; each handles WRITEWISE_THREADS requests at a time
+workers = int(os.getenv("WRITEWISE_WORKERS", 2))
+threads = int(os.getenv("WRITEWISE_THREADS", 4))
+worker_class = "gthread"
+
+# Load the app (and its models) in the master so workers share them copy-on-write
+preload_app = True
+
+# Seconds a worker may stay silent before it is restarted; analyses of large mailboxes take a while
+timeout = int(os.getenv("WRITEWISE_WORKER_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = os.getenv("WRITEWISE_ACCESS_LOG", "-")
+
+# Split the CPUs between the workers' feature extraction pools unless configured
+os.environ.setdefault("WRITEWISE_FEATURE_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+def post_worker_init(worker):
+    # Process pools cannot be inherited across fork, so each worker starts its own;
+    # its processes fork from the worker and share the preloaded model as well
+    from feature_pool import start_feature_pool
+    start_feature_pool()
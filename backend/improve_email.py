@@ -4,11 +4,20 @@ import json
 import requests
 from datetime import datetime
 from style_validator import validate_style_match, improve_style_match
+from llm_client import get_llm_client
+from reply_stream import IncrementalFieldParser, iter_completion_text
 
 # Get API key from environment variable without a fallback 
 # so it's clear when it's not set properly
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Model settings sent with every improvement request (also part of the improvement cache key)
+LLM_MODEL_PARAMS = {
+    "model": "gpt-4",  # Use GPT-4 for better style matching and context understanding
+    "temperature": 0.7,
+    "max_tokens": 800  # Increased max tokens to accommodate longer emails
+}
+
 # Helper to find the latest file with a given prefix in a directory
 def get_latest_file(user_dir, prefix):
     """
@@ -157,48 +166,19 @@ def build_prompt(recipients, profile, content, feedback=None):
     )
     return prompt
 
-def query_chatgpt(prompt, recipients, profile, content, subject=""):
+def build_messages(recipients, profile, content, subject=""):
     """
-    Query ChatGPT with the enhanced prompt structure using GPT-4
+    Build the chat messages asking the model to pick a style cluster and rewrite the draft.
     
     Args:
-        prompt: (Deprecated, kept for backward compatibility)
         recipients: Email recipients
         profile: User's writing profile with style clusters
         content: Draft email content
         subject: Email subject
-
+        
     Returns:
-        dict: Improved email with subject line
+        list: Chat completion messages
     """
-    # Check if API key is available
-    if not OPENAI_API_KEY:
-        error_message = (
-            "OpenAI API key is not set. Please set the OPENAI_API_KEY environment variable.\n\n"
-            "Two ways to fix this:\n"
-            "1. Create a .env file in the backend directory with this content:\n"
-            "   OPENAI_API_KEY=your_api_key_here\n\n"
-            "2. Or set the environment variable in your terminal:\n"
-            "   export OPENAI_API_KEY=your_api_key_here\n\n"
-            "You can get an API key from https://platform.openai.com/api-keys\n\n"
-            "After setting the API key, restart the server."
-        )
-        print("\n" + "!" * 80)
-        print(error_message)
-        print("!" * 80 + "\n")
-        return {
-            "subject": "API Key Error",
-            "email": "The OpenAI API key is missing. Please check the server console for instructions.",
-            "cluster": "Error",
-            "error": "Missing API key"
-        }
-    
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
     # Extract main profile and style clusters
     main_profile = profile.get("main_profile", {})
     style_clusters = profile.get("style_clusters", [])
@@ -279,88 +259,197 @@ def query_chatgpt(prompt, recipients, profile, content, subject=""):
             )
         }
     ]
+    return messages
+
+def parse_reply(reply, content, subject=""):
+    """
+    Extract the improved email from the model's reply.
     
-    # API request data
-    data = {
-        "model": "gpt-4",  # Use GPT-4 for better style matching and context understanding
-        "messages": messages,
-        "temperature": 0.7,
-        "max_tokens": 800  # Increased max tokens to accommodate longer emails
+    Args:
+        reply: Text of the model's answer
+        content: Original draft, used if the reply lacks an email body
+        subject: Original subject, used if the reply lacks a subject
+        
+    Returns:
+        dict: Improved email with subject, email and cluster keys
+    """
+    # Try to extract the JSON portion if mixed with text
+    json_start = reply.find('{')
+    json_end = reply.rfind('}') + 1
+    
+    if json_start >= 0 and json_end > json_start:
+        json_str = reply[json_start:json_end]
+        try:
+            result = json.loads(json_str)
+            # Ensure the required fields are present
+            if "subject" not in result or "email" not in result:
+                # Add missing fields with defaults if needed
+                if "subject" not in result:
+                    result["subject"] = subject or "No Subject"
+                if "email" not in result:
+                    result["email"] = content
+            return result
+        except json.JSONDecodeError:
+            # If JSON parsing fails, return the full reply 
+            return {
+                "subject": subject or "No Subject",
+                "email": reply,
+                "cluster": "Unknown",
+                "parsing_error": "Could not parse JSON from response"
+            }
+    else:
+        # No JSON found, use the full reply as the email content
+        return {
+            "subject": subject or "No Subject",
+            "email": reply,
+            "cluster": "Unknown",
+            "parsing_error": "No JSON found in response"
+        }
+
+def _missing_key_result():
+    """Result returned when OPENAI_API_KEY is not configured"""
+    error_message = (
+        "OpenAI API key is not set. Please set the OPENAI_API_KEY environment variable.\n\n"
+        "Two ways to fix this:\n"
+        "1. Create a .env file in the backend directory with this content:\n"
+        "   OPENAI_API_KEY=your_api_key_here\n\n"
+        "2. Or set the environment variable in your terminal:\n"
+        "   export OPENAI_API_KEY=your_api_key_here\n\n"
+        "You can get an API key from https://platform.openai.com/api-keys\n\n"
+        "After setting the API key, restart the server."
+    )
+    print("\n" + "!" * 80)
+    print(error_message)
+    print("!" * 80 + "\n")
+    return {
+        "subject": "API Key Error",
+        "email": "The OpenAI API key is missing. Please check the server console for instructions.",
+        "cluster": "Error",
+        "error": "Missing API key"
+    }
+
+def _authorization_error_result(response_text):
+    """Result returned when the API rejects the key (401)"""
+    error_message = (
+        "OpenAI API Authorization Error (401):\n\n"
+        "Your API key is invalid or expired. Please update it using one of these methods:\n\n"
+        "1. Update the .env file in the backend directory with:\n"
+        "   OPENAI_API_KEY=your_new_api_key_here\n\n"
+        "2. Or set the environment variable in your terminal:\n"
+        "   export OPENAI_API_KEY=your_new_api_key_here\n\n"
+        "You can get a new API key from https://platform.openai.com/api-keys\n\n"
+        "After updating the API key, restart the server."
+    )
+    print("\n" + "!" * 80)
+    print(error_message) 
+    print("!" * 80 + "\n")
+    return {
+        "subject": "API Authorization Error",
+        "email": "There was an authorization error when connecting to OpenAI's API. Your API key may be invalid or expired. Please check the server console for instructions.",
+        "cluster": "Error",
+        "error": f"API Authorization Error: {response_text}"
+    }
+
+def _request_error_result(e):
+    """Result returned when the API request fails"""
+    error_message = f"API request error: {str(e)}"
+    print("\n" + "!" * 50)
+    print(error_message)
+    print("!" * 50 + "\n")
+    return {
+        "subject": "Error: API request failed",
+        "email": f"An error occurred when connecting to OpenAI's API: {str(e)}",
+        "cluster": "Error",
+        "error": str(e)
+    }
+
+def _request_headers():
+    return {
+        "Authorization": f"Bearer {OPENAI_API_KEY}",
+        "Content-Type": "application/json"
     }
+
+def query_chatgpt(prompt, recipients, profile, content, subject=""):
+    """
+    Query ChatGPT with the enhanced prompt structure using GPT-4
+    
+    Args:
+        prompt: (Deprecated, kept for backward compatibility)
+        recipients: Email recipients
+        profile: User's writing profile with style clusters
+        content: Draft email content
+        subject: Email subject
+
+    Returns:
+        dict: Improved email with subject line
+    """
+    # Check if API key is available
+    if not OPENAI_API_KEY:
+        return _missing_key_result()
+    
+    messages = build_messages(recipients, profile, content, subject)
+    
+    # API request data
+    data = dict(LLM_MODEL_PARAMS, messages=messages)
     
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = get_llm_client().post(data, _request_headers())
         
         # Check for authorization issues specifically
         if response.status_code == 401:
-            error_message = (
-                "OpenAI API Authorization Error (401):\n\n"
-                "Your API key is invalid or expired. Please update it using one of these methods:\n\n"
-                "1. Update the .env file in the backend directory with:\n"
-                "   OPENAI_API_KEY=your_new_api_key_here\n\n"
-                "2. Or set the environment variable in your terminal:\n"
-                "   export OPENAI_API_KEY=your_new_api_key_here\n\n"
-                "You can get a new API key from https://platform.openai.com/api-keys\n\n"
-                "After updating the API key, restart the server."
-            )
-            print("\n" + "!" * 80)
-            print(error_message) 
-            print("!" * 80 + "\n")
-            return {
-                "subject": "API Authorization Error",
-                "email": "There was an authorization error when connecting to OpenAI's API. Your API key may be invalid or expired. Please check the server console for instructions.",
-                "cluster": "Error",
-                "error": f"API Authorization Error: {response.text}"
-            }
+            return _authorization_error_result(response.text)
         
         # Handle other error codes
         response.raise_for_status()
         
         reply = response.json()["choices"][0]["message"]["content"]
+        return parse_reply(reply, content, subject)
+    except requests.exceptions.RequestException as e:
+        return _request_error_result(e)
+
+def stream_chatgpt(recipients, profile, content, subject=""):
+    """
+    Streaming variant of query_chatgpt.
+    
+    Requests a streamed completion and decodes the "subject", "email" and
+    "cluster" values of the JSON answer while it is still arriving.
+    
+    Args:
+        recipients: Email recipients
+        profile: User's writing profile with style clusters
+        content: Draft email content
+        subject: Email subject
         
-        # Try to extract the JSON portion if mixed with text
-        json_start = reply.find('{')
-        json_end = reply.rfind('}') + 1
-        
-        if json_start >= 0 and json_end > json_start:
-            json_str = reply[json_start:json_end]
-            try:
-                result = json.loads(json_str)
-                # Ensure the required fields are present
-                if "subject" not in result or "email" not in result:
-                    # Add missing fields with defaults if needed
-                    if "subject" not in result:
-                        result["subject"] = subject or "No Subject"
-                    if "email" not in result:
-                        result["email"] = content
-                return result
-            except json.JSONDecodeError:
-                # If JSON parsing fails, return the full reply 
-                return {
-                    "subject": subject or "No Subject",
-                    "email": reply,
-                    "cluster": "Unknown",
-                    "parsing_error": "Could not parse JSON from response"
-                }
-        else:
-            # No JSON found, use the full reply as the email content
-            return {
-                "subject": subject or "No Subject",
-                "email": reply,
-                "cluster": "Unknown",
-                "parsing_error": "No JSON found in response"
-            }
+    Yields:
+        tuple: ("delta", {"field": name, "text": chunk}) for each decoded piece of
+            a field value, then one ("result", dict) with the same result
+            query_chatgpt would return
+    """
+    if not OPENAI_API_KEY:
+        yield "result", _missing_key_result()
+        return
+    
+    data = dict(LLM_MODEL_PARAMS, messages=build_messages(recipients, profile, content, subject), stream=True)
+    
+    try:
+        response = get_llm_client().post(data, _request_headers(), stream=True)
+        with response:
+            if response.status_code == 401:
+                yield "result", _authorization_error_result(response.text)
+                return
+            response.raise_for_status()
+            
+            parser = IncrementalFieldParser(("subject", "email", "cluster"))
+            reply_parts = []
+            for text in iter_completion_text(response):
+                reply_parts.append(text)
+                for field, chunk in parser.feed(text):
+                    yield "delta", {"field": field, "text": chunk}
     except requests.exceptions.RequestException as e:
-        error_message = f"API request error: {str(e)}"
-        print("\n" + "!" * 50)
-        print(error_message)
-        print("!" * 50 + "\n")
-        return {
-            "subject": "Error: API request failed",
-            "email": f"An error occurred when connecting to OpenAI's API: {str(e)}",
-            "cluster": "Error",
-            "error": str(e)
-        }
+        yield "result", _request_error_result(e)
+        return
+    
+    yield "result", parse_reply("".join(reply_parts), content, subject)
 
 def save_improved_result(improved, validation_report, user_dir, user_id):
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
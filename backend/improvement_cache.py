@@ -0,0 +1,166 @@
+import os
+import re
+import copy
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from file_lock import file_lock
+
+# Seconds an improvement stays valid
+IMPROVEMENT_CACHE_TTL = int(os.getenv("WRITEWISE_IMPROVEMENT_CACHE_TTL", 24 * 3600))
+
+# Maximum number of improvements kept per user
+IMPROVEMENT_CACHE_SIZE = int(os.getenv("WRITEWISE_IMPROVEMENT_CACHE_SIZE", 200))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text):
+    """Collapse whitespace runs so drafts differing only in spacing share a key"""
+    if not isinstance(text, str):
+        return ""
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+def normalize_recipients(recipients):
+    """Canonical form of the recipients field, whether a string, a list or a to/cc dict"""
+    def addresses(value):
+        if isinstance(value, str):
+            value = value.split(",")
+        if not isinstance(value, list):
+            return []
+        return sorted({normalize_text(str(address)).lower() for address in value} - {""})
+
+    if isinstance(recipients, dict):
+        return {str(field): addresses(value) for field, value in sorted(recipients.items())}
+    return addresses(recipients)
+
+def profile_version(profile):
+    """Content hash of a profile; any re-analysis that changes it changes the version"""
+    encoded = json.dumps(profile, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+
+def improvement_key(profile, subject, content, recipients, model_params):
+    """
+    Cache key for an improvement request.
+
+    Args:
+        profile: Profile the improvement is based on
+        subject: Email subject
+        content: Draft email content
+        recipients: Recipients as sent by the extension
+        model_params: Model settings of the LLM request
+
+    Returns:
+        str: Hex digest
+    """
+    payload = {
+        "profile": profile_version(profile),
+        "subject": normalize_text(subject),
+        "content": normalize_text(content),
+        "recipients": normalize_recipients(recipients),
+        "model": model_params,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+class ImprovementCache:
+    """
+    Per-user cache of improved drafts with TTL and LRU eviction.
+
+    Entries are kept in memory and persisted to a single JSON file, so
+    repeat requests survive restarts without another LLM call. Saves merge
+    in entries other server processes wrote to the file since it was read.
+    """
+
+    def __init__(self, path, ttl=IMPROVEMENT_CACHE_TTL, max_entries=IMPROVEMENT_CACHE_SIZE):
+        """
+        Args:
+            path: JSON file backing the cache
+            ttl: Seconds an entry stays valid
+            max_entries: Maximum number of entries
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable improvement cache {os.path.basename(self.path)}: {e}")
+            return {}
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = OrderedDict(self._read())
+
+    def _prune(self, now):
+        expired = [k for k, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for k in expired:
+            del self._entries[k]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self, now):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with file_lock(self.path):
+            # Entries only on disk were added by other processes; they count as least recently used here
+            merged = OrderedDict(sorted(((k, entry) for k, entry in self._read().items() if k not in self._entries),
+                                        key=lambda item: item[1]["created_at"]))
+            merged.update(self._entries)
+            self._entries = merged
+            self._prune(now)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        """
+        Cached improvement for key, or None if missing or expired.
+
+        Returns a copy, so callers may modify the result.
+        """
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["created_at"] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(entry["result"])
+
+    def put(self, key, result):
+        """Store an improvement and persist the cache"""
+        with self._lock:
+            self._load()
+            now = time.time()
+            self._entries[key] = {"created_at": now, "result": copy.deepcopy(result)}
+            self._entries.move_to_end(key)
+            self._prune(now)
+            try:
+                self._save(now)
+            except Exception as e:
+                logging.warning(f"Failed to persist improvement cache: {e}")
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_improvement_cache(user_dir):
+    """The improvement cache stored under a user's directory"""
+    path = os.path.join(user_dir, "cache", "improvements.json")
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = ImprovementCache(path)
+        return cache
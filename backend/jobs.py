@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Job IDs are uuid4 hex strings; anything else is never looked up on disk
+JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+# Analyses allowed to run at the same time in this server process
+MAX_CONCURRENT_JOBS = int(os.getenv("WRITEWISE_MAX_CONCURRENT_JOBS", 2))
+
+# Jobs allowed to wait for a free slot before new submissions are rejected
+MAX_QUEUED_JOBS = int(os.getenv("WRITEWISE_MAX_QUEUED_JOBS", 20))
+
+# Seconds a finished job stays available for polling
+JOB_RETENTION_SECONDS = int(os.getenv("WRITEWISE_JOB_RETENTION_SECONDS", 3600))
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more work"""
+
+class JobQueue:
+    """
+    In-process queue running background jobs on a bounded thread pool.
+
+    Each job gets an ID that can be polled for its stage, percent complete
+    and, once finished, its result or error. With a state_dir every change
+    is also written to <state_dir>/<job id>.json, so any server worker
+    process can answer a poll for a job another worker is running; the
+    concurrency and queue limits still apply per process.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS, max_queued=MAX_QUEUED_JOBS,
+                 retention_seconds=JOB_RETENTION_SECONDS, state_dir=None):
+        """
+        Args:
+            max_workers: Jobs running at the same time
+            max_queued: Jobs allowed to wait for a free slot
+            retention_seconds: Seconds a finished job stays available
+            state_dir: Directory for job state files shared between
+                processes (None keeps jobs in memory only)
+        """
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.state_dir = state_dir
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Created on first use so forked server workers each get their own threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="analysis-job")
+        return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn(*args, progress=callback, **kwargs) and return the new job ID.
+
+        The progress callback takes (stage, percent) and updates the job.
+
+        Raises:
+            QueueFullError: If too many jobs are already waiting or running
+        """
+        with self._lock:
+            self._prune()
+            active = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+            if active >= self.max_workers + self.max_queued:
+                raise QueueFullError(f"{active} analysis jobs already pending")
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            self._jobs[job_id] = {
+                "id": job_id,
+                "status": "queued",
+                "stage": "queued",
+                "percent": 0,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self._write_state(self._jobs[job_id])
+            self._get_executor().submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _write_state(self, job):
+        # Called with self._lock held, so a job's state file is written in update order
+        if self.state_dir is None:
+            return
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            path = self._state_path(job["id"])
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.warning(f"Failed to save state of job {job['id'][:8]}: {e}")
+
+    def _read_state(self, job_id):
+        if self.state_dir is None or not JOB_ID_RE.fullmatch(job_id):
+            return None
+        try:
+            with open(self._state_path(job_id), "r", encoding="utf-8") as f:
+                job = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable state of job {job_id[:8]}: {e}")
+            return None
+        if job["status"] in ("done", "failed") and job["updated_at"] < time.time() - self.retention_seconds:
+            return None
+        return job
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                job["updated_at"] = time.time()
+                self._write_state(job)
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, status="running", stage="starting")
+
+        def progress(stage, percent):
+            self._update(job_id, stage=stage, percent=int(percent))
+
+        try:
+            result = fn(*args, progress=progress, **kwargs)
+        except Exception as e:
+            logging.error(f"Job {job_id[:8]} failed: {e}")
+            self._update(job_id, status="failed", stage="failed", error=str(e))
+        else:
+            self._update(job_id, status="done", stage="done", percent=100, result=result)
+
+    def get(self, job_id):
+        """Return a snapshot of the job, or None if it is unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        # Submitted to another server process
+        return self._read_state(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["status"] in ("done", "failed") and job["updated_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.state_dir is None or not os.path.isdir(self.state_dir):
+            return
+        # State files of every process; a job left untouched this long has finished or lost its worker
+        for name in os.listdir(self.state_dir):
+            path = os.path.join(self.state_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
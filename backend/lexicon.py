@@ -0,0 +1,87 @@
+import re
+from collections import Counter
+
+# Words are runs of letters/digits; terms and text are tokenized the same way
+_WORD_RE = re.compile(r"\w+")
+
+class LexiconHits:
+    """Matches of a single lexicon in one text"""
+    __slots__ = ("counts", "first_start", "last_start")
+
+    def __init__(self):
+        self.counts = Counter()
+        self.first_start = None
+        self.last_start = None
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def add(self, term, start):
+        self.counts[term] += 1
+        if self.first_start is None:
+            self.first_start = start
+        self.last_start = start
+
+class LexiconMatcher:
+    """
+    Counts whole-word matches for several lexicons in a single pass over a text.
+
+    Terms may be single words or multi-word phrases ("thank you"). All terms are
+    stored in one hash table keyed by their word tuple, so the cost per text is
+    O(words * longest phrase) no matter how many terms the lexicons hold.
+    Matching is case-insensitive and respects word boundaries ("bad" does not
+    match "badge"); the words of a phrase may only be separated by whitespace.
+    """
+
+    def __init__(self, lexicons):
+        """
+        Args:
+            lexicons: Dict mapping lexicon name to an iterable of terms
+        """
+        self.names = list(lexicons)
+        self._terms = {}
+        self._prefixes = set()
+        self._max_words = 1
+        for name, terms in lexicons.items():
+            for term in terms:
+                words = tuple(_WORD_RE.findall(term.lower()))
+                if not words:
+                    continue
+                self._terms.setdefault(words, []).append((name, term))
+                for n in range(1, len(words)):
+                    self._prefixes.add(words[:n])
+                self._max_words = max(self._max_words, len(words))
+
+    def scan(self, text):
+        """
+        Match every lexicon against the text.
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            dict: Lexicon name -> LexiconHits (present for every lexicon, possibly empty).
+                Offsets refer to text.lower().
+        """
+        hits = {name: LexiconHits() for name in self.names}
+        lower = text.lower()
+        words = [(m.group(), m.start(), m.end()) for m in _WORD_RE.finditer(lower)]
+        terms = self._terms
+        prefixes = self._prefixes
+
+        for i, (word, start, _) in enumerate(words):
+            key = (word,)
+            j = i
+            while True:
+                for name, term in terms.get(key, ()):
+                    hits[name].add(term, start)
+                if key not in prefixes or j + 1 >= len(words):
+                    break
+                # Extend the phrase only across whitespace
+                gap = lower[words[j][2]:words[j + 1][1]]
+                if not gap.isspace():
+                    break
+                j += 1
+                key = key + (words[j][0],)
+        return hits
@@ -0,0 +1,125 @@
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import timed, inc
+
+# Chat completions endpoint; point it at a local stub server for testing
+OPENAI_API_URL = os.getenv("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
+
+# Seconds to wait for the connection and for each read from the upstream API
+LLM_CONNECT_TIMEOUT = float(os.getenv("WRITEWISE_LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.getenv("WRITEWISE_LLM_READ_TIMEOUT", 60))
+
+# Extra attempts after a connection failure, 429 or 5xx response
+LLM_MAX_RETRIES = int(os.getenv("WRITEWISE_LLM_MAX_RETRIES", 2))
+
+# Backoff before retry n is uniform in [0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2**n)]
+LLM_BACKOFF_BASE = float(os.getenv("WRITEWISE_LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("WRITEWISE_LLM_BACKOFF_MAX", 8))
+
+# Keep-alive connections kept open to the API host
+LLM_POOL_SIZE = int(os.getenv("WRITEWISE_LLM_POOL_SIZE", 10))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+class LLMClient:
+    """
+    HTTP client for the chat completions API.
+
+    Requests go through one requests.Session whose connection pool keeps
+    connections to the API host alive, so repeated improvements skip the
+    TCP and TLS handshakes. Every request has connect and read timeouts.
+    Connection failures (including connect timeouts), 429 and 5xx responses
+    are retried a bounded number of times with jittered exponential backoff
+    (honouring Retry-After when the server sends one). A read timeout is not
+    retried: the upstream may still be generating the billed completion,
+    and a resend would only add another full read timeout.
+    """
+
+    def __init__(self, url=OPENAI_API_URL, connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, pool_size=LLM_POOL_SIZE):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # A session inherited across fork would share sockets with the parent
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def _backoff(self, attempt, response=None):
+        delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, min(float(retry_after), LLM_BACKOFF_MAX))
+        return delay
+
+    def post(self, payload, headers, stream=False):
+        """
+        POST a JSON payload, retrying transient failures.
+
+        Args:
+            payload: JSON-serializable request body
+            headers: Request headers
+            stream: Passed to requests; the caller must consume or close the response
+
+        Returns:
+            requests.Response: The final response, which may still be an
+                error status once retries are exhausted
+
+        Raises:
+            requests.exceptions.RequestException: If the last attempt failed
+                without a response (connection error or timeout)
+        """
+        with timed("llm_request"):
+            return self._post_with_retries(payload, headers, stream)
+
+    def _post_with_retries(self, payload, headers, stream):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.url, headers=headers, json=payload,
+                                             timeout=self.timeout, stream=stream)
+            except requests.exceptions.ConnectionError as e:
+                # Includes ConnectTimeout; a ReadTimeout propagates to the caller right away
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"LLM request failed ({e.__class__.__name__}); retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                delay = self._backoff(attempt, response)
+                logging.warning(f"LLM request returned {response.status_code}; retrying in {delay:.2f}s")
+                response.close()
+            inc("writewise_llm_retries_total")
+            time.sleep(delay)
+            attempt += 1
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_llm_client():
+    """Process-wide LLMClient configured from the environment"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
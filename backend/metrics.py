@@ -0,0 +1,160 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Set to 0 to turn all instrumentation into no-ops
+METRICS_ENABLED = os.getenv("WRITEWISE_METRICS", "1") != "0"
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Upper bounds (bytes) of the payload size histogram buckets
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "writewise_stage_seconds": (
+        "histogram", "Time spent in each pipeline stage", LATENCY_BUCKETS),
+    "writewise_http_request_seconds": (
+        "histogram", "HTTP request latency by endpoint", LATENCY_BUCKETS),
+    "writewise_payload_bytes": (
+        "histogram", "Size of request bodies by endpoint", SIZE_BUCKETS),
+    "writewise_cache_requests_total": (
+        "counter", "Cache lookups by cache and result (hit/miss)", None),
+    "writewise_email_errors_total": (
+        "counter", "Emails that failed a pipeline stage", None),
+    "writewise_llm_retries_total": (
+        "counter", "LLM requests retried after a transient failure", None),
+}
+
+class Registry:
+    """
+    Thread-safe store of counters and histograms keyed by metric name and labels.
+
+    Snapshots are plain dicts, so worker processes can send what they
+    recorded back to the parent, which merges them into its own registry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(buckets, value)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self, reset=False):
+        """Copy of all series; with reset=True the registry starts over (for per-task deltas)"""
+        with self._lock:
+            snapshot = {
+                "counters": list(self._counters.items()),
+                "histograms": [(key, list(series)) for key, series in self._histograms.items()],
+            }
+            if reset:
+                self._counters.clear()
+                self._histograms.clear()
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a snapshot taken in another process"""
+        if not snapshot:
+            return
+        with self._lock:
+            for key, value in snapshot["counters"]:
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, other in snapshot["histograms"]:
+                series = self._histograms.get(key)
+                if series is None:
+                    self._histograms[key] = list(other)
+                else:
+                    for i, value in enumerate(other):
+                        series[i] += value
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        by_name = {}
+        for (name, labels), value in snapshot["counters"]:
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), series in snapshot["histograms"]:
+            by_name.setdefault(name, []).append((labels, series))
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name.get(name, ()), key=lambda item: item[0]):
+                if kind == "counter":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+REGISTRY = Registry()
+
+def inc(name, amount=1, **labels):
+    """Increment a counter"""
+    if METRICS_ENABLED:
+        REGISTRY.inc(name, amount, **labels)
+
+def observe(name, value, **labels):
+    """Record a histogram observation"""
+    if METRICS_ENABLED:
+        REGISTRY.observe(name, value, **labels)
+
+@contextmanager
+def _stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe("writewise_stage_seconds", time.perf_counter() - start, stage=stage)
+
+@contextmanager
+def _noop():
+    yield
+
+def timed(stage):
+    """
+    Context manager recording the duration of a pipeline stage.
+
+    Usage: with timed("spacy_parse"): doc = nlp(text)
+    """
+    return _stage_timer(stage) if METRICS_ENABLED else _noop()
+
+def cache_lookup(cache, hit):
+    """Count one cache lookup"""
+    if METRICS_ENABLED:
+        REGISTRY.inc("writewise_cache_requests_total", cache=cache, result="hit" if hit else "miss")
@@ -1,4 +1,8 @@
+import os
 import re
+import threading
+from html.entities import html5
+from html.parser import HTMLParser
 from bs4 import BeautifulSoup
 try:
     from email_reply_parser import EmailReplyParser
@@ -22,6 +26,279 @@ def deduplicate_emails(emails):
     
     return list(unique_emails.values())
 
+# Anything html.parser would treat as a tag, comment, declaration or entity
+MARKUP_RE = re.compile(r"<[a-zA-Z/!?]|&[#a-zA-Z]")
+
+class _TextExtractor(HTMLParser):
+    """
+    Streaming tag stripper producing the same text as BeautifulSoup(...).get_text().
+
+    Text inside <script>, <style> and <template> is dropped, comments and
+    declarations are skipped, and entities are decoded the way BeautifulSoup's
+    html.parser builder decodes them. Like BeautifulSoup, a string between
+    two tags that is nothing but whitespace becomes a single newline (or a
+    space if it has no line break), except inside <pre> and <textarea>.
+    """
+    SKIPPED_TAGS = {"script", "style", "template"}
+    PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+    ASCII_SPACES = " \n\t\f\r"
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts = []
+        self._data = []
+        self._skip_depth = 0
+        self._preserve_stack = []
+
+    def _end_data(self):
+        # One BeautifulSoup string ends at every tag, comment or declaration
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        if self._skip_depth:
+            return
+        if not self._preserve_stack and not data.strip(self.ASCII_SPACES):
+            data = "\n" if "\n" in data else " "
+        self.parts.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._end_data()
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+        if tag in self.PRESERVE_WHITESPACE_TAGS:
+            self._preserve_stack.append(tag)
+
+    def handle_endtag(self, tag):
+        self._end_data()
+        if tag in self.SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        if self._preserve_stack and self._preserve_stack[-1] == tag:
+            self._preserve_stack.pop()
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def close(self):
+        super().close()
+        self._end_data()
+
+    def handle_entityref(self, name):
+        character = html5.get(f"{name};")
+        self.handle_data(character if character is not None else f"&{name}")
+
+    def handle_charref(self, name):
+        try:
+            codepoint = int(name[1:], 16) if name[:1] in ("x", "X") else int(name)
+        except ValueError:
+            codepoint = None
+        data = None
+        if codepoint and codepoint < 256:
+            # Low numeric references are often meant as windows-1252
+            try:
+                data = bytes([codepoint]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data and codepoint:
+            try:
+                data = chr(codepoint)
+            except (ValueError, OverflowError):
+                pass
+        self.handle_data(data or "\N{REPLACEMENT CHARACTER}")
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.startswith("CDATA["):
+            self.handle_data(data[len("CDATA["):])
+            self._end_data()
+
+def html_to_text(text):
+    """
+    Convert an email body to plain text.
+
+    Plain-text bodies (no tags or entities) are returned unchanged without any
+    parsing; HTML bodies go through a streaming tag stripper instead of a full
+    BeautifulSoup tree. Line endings in HTML bodies are normalized to "\n"
+    first, since CRLF markup from Outlook and Windows clients would otherwise
+    keep "\r\n" inside text and hide paragraph breaks.
+    """
+    if not MARKUP_RE.search(text):
+        return text
+    extractor = _TextExtractor()
+    extractor.feed(normalize_newlines(text))
+    extractor.close()
+    return "".join(extractor.parts)
+
+def normalize_newlines(text):
+    """Turn CRLF and lone CR line endings into LF"""
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+def html_to_text_soup(text):
+    """Reference HTML-to-text conversion with a full BeautifulSoup parse"""
+    return BeautifulSoup(text, "html.parser").get_text()
+
+# Locale pattern packs for the cleanup stages. Each stage lists
+# (pattern, required_literal) pairs; a pattern is only tried when its
+# lowercase literal occurs in the text, which skips the expensive lazy
+# DOTALL scans on emails that cannot match.
+#   forward:   matched spans are removed wherever they occur
+#   reply:     the text is cut at the earliest match
+#   signature: the text is cut at the earliest match (^/$ match at line breaks)
+LOCALE_PACKS = {
+    "en": {
+        "forward": [
+            (r"(-+\s*Forwarded message\s*-+).*?(-+\s*End forwarded message\s*-+)", "end forwarded message"),
+            (r"(From:.*?Sent:.*?To:.*?Subject:.*?\n)", "subject:"),
+            (r"(On\s+.*?wrote:)", "wrote:"),
+            (r"(Begin forwarded message:)", "begin forwarded message:"),
+            (r"(Original Message\s*-+)", "original message"),
+            (r"(From:.*?\[mailto:.*?\].*?Sent:.*?To:.*?Subject:.*?\n)", "[mailto:"),
+        ],
+        "reply": [
+            (r"(On\s+.*?,.*?wrote:)", "wrote:"),
+            (r"(On\s+.*?at\s+.*?,\s+.*?wrote:)", "wrote:"),
+            (r"(From:.*?Sent:.*?To:.*?Subject:.*?\n)", "subject:"),
+            (r"(From:.*?<.*?>.*?Date:.*?Subject:.*?\n)", "subject:"),
+            (r"(On.*?,.*?<.*?>.*?wrote:)", "wrote:"),
+            (r"(-----Original Message-----)", "-----original message-----"),
+        ],
+        "signature": [
+            (r"(-- ?\n.*$)", "--"),  # -- \n signature
+            (r"(^Sent from my .*$)", "sent from my "),
+            (r"(^Best regards,.*$)", "best regards,"),
+            (r"(^Kind regards,.*$)", "kind regards,"),
+            (r"(^Sincerely,.*$)", "sincerely,"),
+            (r"(^Cheers,.*$)", "cheers,"),
+            (r"(^Thanks,.*$)", "thanks,"),
+            (r"(^Thank you,.*$)", "thank you,"),
+            (r"(^Many thanks,.*$)", "many thanks,"),
+            (r"(^Regards,.*$)", "regards,"),
+        ],
+    },
+    "nl": {
+        "signature": [
+            (r"(^Met vriendelijke groet,.*$)", "met vriendelijke groet,"),
+        ],
+    },
+    "de": {
+        "signature": [
+            (r"(^Mit freundlichen Grüßen,.*$)", "mit freundlichen grüßen,"),
+        ],
+    },
+    "fr": {
+        "reply": [
+            (r"(Le.*?a écrit :)", "a écrit :"),
+        ],
+    },
+}
+
+_STAGE_FLAGS = {
+    "forward": re.IGNORECASE | re.MULTILINE | re.DOTALL,
+    "reply": re.IGNORECASE | re.DOTALL,
+    "signature": re.IGNORECASE | re.MULTILINE | re.DOTALL,
+}
+
+QUOTED_LINE_RE = re.compile(r"^>.*$", re.MULTILINE)
+BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+class CleanupEngine:
+    """
+    Removes forwarded blocks, quoted replies and signatures in one regex scan per stage.
+
+    The patterns of all enabled locale packs are merged into a single
+    alternation per stage. Only patterns whose required literal appears in
+    the text take part; the merged regex for each such subset is compiled
+    once and reused.
+    """
+
+    def __init__(self, locales=None):
+        """
+        Args:
+            locales: Names of the LOCALE_PACKS to enable (default: all)
+        """
+        self.locales = list(locales) if locales else list(LOCALE_PACKS)
+        self._stages = {stage: [] for stage in _STAGE_FLAGS}
+        for locale in self.locales:
+            pack = LOCALE_PACKS[locale]
+            for stage, patterns in pack.items():
+                self._stages[stage].extend(patterns)
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def _stage_regex(self, stage, lowered):
+        active = tuple(i for i, (_, literal) in enumerate(self._stages[stage])
+                       if not literal or literal in lowered)
+        if not active:
+            return None
+        key = (stage, active)
+        regex = self._compiled.get(key)
+        if regex is None:
+            merged = "|".join(f"(?:{self._stages[stage][i][0]})" for i in active)
+            regex = re.compile(merged, _STAGE_FLAGS[stage])
+            with self._lock:
+                self._compiled[key] = regex
+        return regex
+
+    def _cut_at_earliest(self, stage, text):
+        regex = self._stage_regex(stage, text.lower())
+        if regex is not None:
+            match = regex.search(text)
+            if match:
+                return text[:match.start()]
+        return text
+
+    def clean(self, text):
+        """
+        Strip quoted lines, forwarded content, reply headers and signatures from plain text.
+        """
+        # Remove lines starting with '>' (quoted text)
+        text = QUOTED_LINE_RE.sub("", text)
+
+        # Remove common forwarded content markers
+        regex = self._stage_regex("forward", text.lower())
+        if regex is not None:
+            text = regex.sub("", text)
+
+        # Remove text after common reply line markers
+        text = self._cut_at_earliest("reply", text)
+
+        # Remove common signature blocks
+        text = self._cut_at_earliest("signature", text)
+
+        # Clean up empty lines and whitespace
+        text = BLANK_LINES_RE.sub("\n\n", text)
+        return text.strip()
+
+def register_locale_pack(name, pack):
+    """
+    Add (or replace) a locale pattern pack and enable it in the default engine.
+
+    Args:
+        name: Locale name, e.g. "es"
+        pack: Dict mapping stage ("forward", "reply", "signature") to a list of
+            (pattern, required_literal) pairs
+    """
+    global CLEANUP_ENGINE
+    unknown = set(pack) - set(_STAGE_FLAGS)
+    if unknown:
+        raise ValueError(f"Unknown cleanup stages in locale pack '{name}': {sorted(unknown)}")
+    LOCALE_PACKS[name] = pack
+    locales = CLEANUP_ENGINE.locales
+    CLEANUP_ENGINE = CleanupEngine(locales if name in locales else locales + [name])
+
+# Comma-separated list of locale packs to enable, e.g. "en,nl"
+_env_locales = [l.strip() for l in os.getenv("WRITEWISE_CLEANUP_LOCALES", "").split(",") if l.strip()]
+CLEANUP_ENGINE = CleanupEngine(_env_locales or None)
+
 def preprocess_email(text):
     """
     Clean email text by:
@@ -35,8 +312,7 @@ def preprocess_email(text):
         return ""
         
     # 1. Remove HTML tags
-    soup = BeautifulSoup(text, "html.parser")
-    text = soup.get_text()
+    text = html_to_text(text)
 
     # 2. Remove quoted text (replies/forwards)
     if EmailReplyParser is not None:
@@ -46,63 +322,5 @@ def preprocess_email(text):
         if parsed_text and len(parsed_text.strip()) > 0:
             text = parsed_text
     
-    # Apply additional cleaning regardless of EmailReplyParser
-    
-    # Remove lines starting with '>' (quoted text)
-    text = re.sub(r"^>.*$", "", text, flags=re.MULTILINE)
-    
-    # Remove common forwarded content markers
-    forward_patterns = [
-        r"(?i)(-+\s*Forwarded message\s*-+).*?(-+\s*End forwarded message\s*-+)",
-        r"(?i)(From:.*?Sent:.*?To:.*?Subject:.*?\n)",
-        r"(?i)(On\s+.*?wrote:)",
-        r"(?i)(Begin forwarded message:)",
-        r"(?i)(Original Message\s*-+)",
-        r"(?i)(From:.*?\[mailto:.*?\].*?Sent:.*?To:.*?Subject:.*?\n)"
-    ]
-    
-    for pattern in forward_patterns:
-        text = re.sub(pattern, "", text, flags=re.MULTILINE | re.DOTALL)
-    
-    # Remove text after common reply line markers
-    reply_markers = [
-        r"(?i)(On\s+.*?,.*?wrote:)",
-        r"(?i)(On\s+.*?at\s+.*?,\s+.*?wrote:)",
-        r"(?i)(From:.*?Sent:.*?To:.*?Subject:.*?\n)",
-        r"(?i)(From:.*?<.*?>.*?Date:.*?Subject:.*?\n)",
-        r"(?i)(On.*?,.*?<.*?>.*?wrote:)",
-        r"(?i)(-----Original Message-----)",
-        r"(?i)(Le.*?a écrit :)"
-    ]
-    
-    for marker in reply_markers:
-        parts = re.split(marker, text, maxsplit=1, flags=re.DOTALL)
-        if len(parts) > 1:
-            text = parts[0]
-
-    # 3. Remove common signature blocks
-    signature_patterns = [
-        r"(?i)(-- ?\n.*$)",  # -- \n signature
-        r"(?i)(^Sent from my .*$)",
-        r"(?i)(^Best regards,.*$)",
-        r"(?i)(^Kind regards,.*$)",
-        r"(?i)(^Sincerely,.*$)",
-        r"(?i)(^Cheers,.*$)",
-        r"(?i)(^Thanks,.*$)",
-        r"(?i)(^Thank you,.*$)",
-        r"(?i)(^Many thanks,.*$)",
-        r"(?i)(^Regards,.*$)",
-        r"(?i)(^Met vriendelijke groet,.*$)",
-        r"(?i)(^Mit freundlichen Grüßen,.*$)",
-    ]
-    
-    for pat in signature_patterns:
-        parts = re.split(pat, text, maxsplit=1, flags=re.MULTILINE | re.DOTALL)
-        if len(parts) > 1:
-            text = parts[0]
-    
-    # Clean up empty lines and whitespace
-    text = re.sub(r'\n\s*\n+', '\n\n', text)
-    text = text.strip()
-    
-    return text 
\ No newline at end of file
+    # 3. Remove forwarded blocks, reply headers and signatures
+    return CLEANUP_ENGINE.clean(text)
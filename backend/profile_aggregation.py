@@ -1,14 +1,15 @@
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, namedtuple
 import numpy as np
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import pairwise_distances_argmin_min
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 import json
 import pandas as pd
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from kneed import KneeLocator
-import matplotlib.pyplot as plt
 import os
+import time
 import statistics
 
 def convert_categorical_to_numeric(value, category_map):
@@ -34,29 +35,81 @@ def convert_tone_axes_to_features(tone_axes, category_maps):
         
     return features
 
-def find_optimal_clusters(X, max_clusters=5):
+# Default model-selection settings for advanced_cluster_tone_axes
+CLUSTERING_DEFAULTS = {
+    "max_clusters": 5,
+    "random_state": 42,
+    # Seed each k from the k-1 solution instead of running n_init fresh restarts
+    "warm_start": True,
+    "n_init": 10,
+    # Evaluate candidate k on at most this many rows (None: always use all rows)
+    "sample_size": 2000,
+    # k-means++ restarts for the chosen k; the warm-started fit is kept if it is better
+    "final_n_init": 3,
+    # Use MiniBatchKMeans for the final fit above this many rows
+    "minibatch_threshold": 20000
+}
+
+def _seed_next_center(X, centers, rng):
+    """Pick one more initial center by k-means++ D^2 sampling around the existing centers"""
+    _, distances = pairwise_distances_argmin_min(X, centers)
+    weights = distances ** 2
+    total = weights.sum()
+    if total <= 0:
+        idx = rng.randint(X.shape[0])
+    else:
+        idx = rng.choice(X.shape[0], p=weights / total)
+    return np.vstack([centers, X[idx]])
+
+def find_optimal_clusters(X, max_clusters=5, random_state=42, warm_start=False, n_init=10,
+                          sample_size=None, return_model=False):
     """
     Automatically determine the optimal number of clusters using the elbow method
     
     Args:
         X: Feature matrix for clustering
         max_clusters: Maximum number of clusters to consider
+        random_state: Seed for sampling and KMeans, making the result deterministic
+        warm_start: Fit each k once, seeded with the k-1 centers plus one
+            D^2-sampled center, instead of n_init independent restarts
+        n_init: Restarts per k when warm_start is False
+        sample_size: If set and X has more rows, candidate k are evaluated on
+            a deterministic random sample of this many rows
+        return_model: Also return the fitted KMeans for the chosen k
+            (fitted on the evaluation rows), so callers need not refit
         
     Returns:
-        Optimal number of clusters
+        Optimal number of clusters, or (n_clusters, model) if return_model is True
     """
+    X = X.toarray() if hasattr(X, "toarray") else np.asarray(X)
+    n_samples = X.shape[0]
+    
     # Ensure we have enough data points
-    max_clusters = min(max_clusters, len(X) - 1)
+    max_clusters = min(max_clusters, n_samples - 1)
     if max_clusters <= 1:
-        return 2  # Default to at least 2 clusters
+        return (2, None) if return_model else 2  # Default to at least 2 clusters
+    
+    rng = np.random.RandomState(random_state)
+    if sample_size and n_samples > sample_size:
+        X_eval = X[np.sort(rng.choice(n_samples, sample_size, replace=False))]
+    else:
+        X_eval = X
     
     distortions = []
+    models = {}
     K_range = range(1, max_clusters + 1)
+    centers = None
     
     for k in K_range:
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        kmeans.fit(X)
+        if warm_start:
+            init = X_eval.mean(axis=0, keepdims=True) if centers is None else _seed_next_center(X_eval, centers, rng)
+            kmeans = KMeans(n_clusters=k, init=init, n_init=1, random_state=random_state)
+        else:
+            kmeans = KMeans(n_clusters=k, random_state=random_state, n_init=n_init)
+        kmeans.fit(X_eval)
+        centers = kmeans.cluster_centers_
         distortions.append(kmeans.inertia_)
+        models[k] = kmeans
     
     # Try to find the elbow point
     try:
@@ -74,8 +127,57 @@ def find_optimal_clusters(X, max_clusters=5):
     except Exception:
         optimal_k = 3  # Default to 3 clusters
     
+    if return_model:
+        return optimal_k, models.get(optimal_k)
     return optimal_k
 
+def fit_tone_clusters(X, options=None):
+    """
+    Choose the number of clusters and fit the final model, reusing the selection fit when possible.
+    
+    Args:
+        X: Feature matrix for clustering
+        options: Overrides for CLUSTERING_DEFAULTS
+        
+    Returns:
+        Tuple of (n_clusters, cluster_labels, fitted model)
+    """
+    config = dict(CLUSTERING_DEFAULTS, **(options or {}))
+    X = X.toarray() if hasattr(X, "toarray") else np.asarray(X)
+    n_samples = X.shape[0]
+    random_state = config["random_state"]
+    
+    n_clusters, model = find_optimal_clusters(
+        X,
+        max_clusters=config["max_clusters"],
+        random_state=random_state,
+        warm_start=config["warm_start"],
+        n_init=config["n_init"],
+        sample_size=config["sample_size"],
+        return_model=True
+    )
+    
+    n_clusters = min(n_clusters, n_samples)
+    fitted_on_all_rows = model is not None and (not config["sample_size"] or n_samples <= config["sample_size"])
+    if fitted_on_all_rows and not config["warm_start"]:
+        # Already the best of n_init restarts on every row
+        return n_clusters, model.labels_, model
+    
+    if config["minibatch_threshold"] and n_samples > config["minibatch_threshold"]:
+        final = MiniBatchKMeans(n_clusters=n_clusters, n_init=config["final_n_init"],
+                                random_state=random_state, batch_size=4096)
+    else:
+        final = KMeans(n_clusters=n_clusters, n_init=config["final_n_init"], random_state=random_state)
+    if model is not None and not fitted_on_all_rows:
+        # Selection ran on a sample: start the full fit from its centers
+        final.set_params(init=model.cluster_centers_, n_init=1)
+    final.fit(X)
+    
+    if fitted_on_all_rows and model.inertia_ <= final.inertia_:
+        # The selection fit for this k is at least as good; reuse it
+        final = model
+    return n_clusters, final.labels_, final
+
 def name_cluster(cluster_profile):
     """
     Name a cluster based on its characteristics
@@ -185,18 +287,28 @@ def extract_cluster_features(cluster_tone_axes):
     
     return features
 
-def advanced_cluster_tone_axes(tone_axes_list):
+# Output of the clustering stage, shared by the profile and the visualization
+ClusteringResult = namedtuple("ClusteringResult", [
+    "matrix",         # Encoded feature matrix (dense, one row per email)
+    "feature_names",  # Column names of the matrix
+    "labels",         # Cluster label per email
+    "centroids",      # Cluster centers in matrix space
+    "n_clusters"      # Chosen number of clusters
+])
+
+def cluster_tone_axes_matrix(tone_axes_list, clustering_options=None):
     """
-    Advanced clustering of tone_axes data with automatic cluster detection and naming
+    Encode tone_axes and cluster them once for every consumer of the clustering.
     
     Args:
         tone_axes_list: List of tone_axes dictionaries
+        clustering_options: Overrides for CLUSTERING_DEFAULTS
         
     Returns:
-        Dictionary with cluster information
+        ClusteringResult, or None if there are fewer than 2 emails
     """
     if not tone_axes_list or len(tone_axes_list) < 2:
-        return {"clusters": []}
+        return None
     
     # Convert to pandas DataFrame for better handling of mixed data types
     df = pd.DataFrame(tone_axes_list)
@@ -222,13 +334,40 @@ def advanced_cluster_tone_axes(tone_axes_list):
     
     # Fit and transform the data
     X_transformed = preprocessor.fit_transform(df)
+    if hasattr(X_transformed, "toarray"):
+        X_transformed = X_transformed.toarray()
+    feature_names = [name.split("__", 1)[-1] for name in preprocessor.get_feature_names_out()]
+    
+    # Find optimal number of clusters and cluster the emails
+    n_clusters, cluster_labels, model = fit_tone_clusters(X_transformed, clustering_options)
+    
+    return ClusteringResult(
+        matrix=X_transformed,
+        feature_names=feature_names,
+        labels=np.asarray(cluster_labels),
+        centroids=model.cluster_centers_,
+        n_clusters=n_clusters
+    )
+
+def advanced_cluster_tone_axes(tone_axes_list, clustering_options=None, clustering=None):
+    """
+    Advanced clustering of tone_axes data with automatic cluster detection and naming
     
-    # Find optimal number of clusters
-    n_clusters = find_optimal_clusters(X_transformed)
+    Args:
+        tone_axes_list: List of tone_axes dictionaries
+        clustering_options: Overrides for CLUSTERING_DEFAULTS
+        clustering: Precomputed ClusteringResult for tone_axes_list (computed if omitted)
+        
+    Returns:
+        Dictionary with cluster information
+    """
+    if not tone_axes_list or len(tone_axes_list) < 2:
+        return {"clusters": []}
     
-    # Perform clustering
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    cluster_labels = kmeans.fit_predict(X_transformed)
+    if clustering is None:
+        clustering = cluster_tone_axes_matrix(tone_axes_list, clustering_options)
+    n_clusters = clustering.n_clusters
+    cluster_labels = clustering.labels
     
     # Analyze each cluster
     clusters = []
@@ -325,6 +464,13 @@ def cluster_tone_axes(tone_axes_list, n_clusters=3):
     
     return {"clusters": clusters}
 
+# Tone axes aggregated by majority vote and by average respectively
+CATEGORICAL_AXES = [
+    "formality", "politeness", "certainty", "greeting", "closing", 
+    "emoji_usage", "passive_voice", "emotion", "directness", "subjectivity_level"
+]
+NUMERIC_AXES = ["readability"]
+
 def aggregate_tone_axes(tone_axes_list):
     """Aggregate a list of tone_axes into a single profile"""
     if not tone_axes_list:
@@ -332,11 +478,8 @@ def aggregate_tone_axes(tone_axes_list):
         
     # For categorical axes, use majority vote; for readability, use average
     axes = tone_axes_list[0].keys()
-    categorical_axes = [
-        "formality", "politeness", "certainty", "greeting", "closing", 
-        "emoji_usage", "passive_voice", "emotion", "directness", "subjectivity_level"
-    ]
-    numeric_axes = ["readability"]
+    categorical_axes = CATEGORICAL_AXES
+    numeric_axes = NUMERIC_AXES
     profile = {}
     
     for axis in axes:
@@ -369,12 +512,139 @@ def aggregate_tone_axes(tone_axes_list):
             
     return profile
 
-def aggregate_user_profile(tone_axes_list):
+# Email keys remembered per profile so re-posted emails are not counted twice
+MAX_SEEN_KEYS = 20000
+
+def new_profile_stats():
+    """Empty running statistics for incremental profile aggregation"""
+    return {
+        "version": 1,
+        "updated_at": None,
+        "email_count": 0,
+        "categorical": {},
+        "numeric": {},
+        "seen_keys": []
+    }
+
+def decay_profile_stats(stats, now, half_life_days):
+    """
+    Exponentially down-weight the accumulated statistics.
+    
+    Weights halve every half_life_days since the last update. Min and max are
+    not decayed. Cost is proportional to the number of categories, not emails.
+    """
+    last = stats.get("updated_at")
+    if not half_life_days or last is None or now <= last:
+        return stats
+    factor = 0.5 ** ((now - last) / 86400.0 / half_life_days)
+    for counts in stats["categorical"].values():
+        for value in counts:
+            counts[value] *= factor
+    for moments in stats["numeric"].values():
+        for field in ("weight", "sum", "sum_sq"):
+            moments[field] *= factor
+    return stats
+
+def update_profile_stats(stats, tone_axes_list, keys=None, now=None, half_life_days=None):
+    """
+    Merge a batch of tone_axes into running profile statistics in O(batch).
+    
+    Args:
+        stats: Statistics from new_profile_stats() or a previous update (modified in place)
+        tone_axes_list: List of tone_axes dictionaries; empty dicts are skipped
+        keys: Optional list of per-email keys (e.g. email ids) aligned with
+            tone_axes_list; emails whose key was already merged are skipped
+        now: Update time in epoch seconds (defaults to the current time)
+        half_life_days: If set, existing weights decay with this half-life
+            before the batch is merged, so recent emails count more
+        
+    Returns:
+        dict: The updated statistics
+    """
+    now = time.time() if now is None else now
+    decay_profile_stats(stats, now, half_life_days)
+    
+    seen = set(stats["seen_keys"])
+    for idx, tone_axes in enumerate(tone_axes_list):
+        if not tone_axes:
+            continue
+        key = keys[idx] if keys is not None else None
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+            stats["seen_keys"].append(key)
+        
+        stats["email_count"] += 1
+        for axis, value in tone_axes.items():
+            if value is None:
+                continue
+            if axis in NUMERIC_AXES:
+                if not isinstance(value, (int, float)):
+                    continue
+                moments = stats["numeric"].setdefault(axis, {
+                    "weight": 0.0, "sum": 0.0, "sum_sq": 0.0, "min": value, "max": value
+                })
+                moments["weight"] += 1.0
+                moments["sum"] += value
+                moments["sum_sq"] += value * value
+                moments["min"] = min(moments["min"], value)
+                moments["max"] = max(moments["max"], value)
+            else:
+                counts = stats["categorical"].setdefault(axis, {})
+                counts[str(value)] = counts.get(str(value), 0.0) + 1.0
+    
+    del stats["seen_keys"][:-MAX_SEEN_KEYS]
+    stats["updated_at"] = now
+    return stats
+
+def profile_from_stats(stats):
+    """
+    Build a main profile (same shape as aggregate_tone_axes) from running statistics.
+    
+    Adds readability_std, derived from the running sum of squares.
+    """
+    profile = {}
+    for axis, counts in stats["categorical"].items():
+        total = sum(counts.values())
+        if total <= 0:
+            profile[axis] = None
+            continue
+        if axis in CATEGORICAL_AXES:
+            # Majority vote; ties go to the value seen first, like Counter.most_common
+            profile[axis] = max(counts, key=counts.get)
+            profile[f"{axis}_distribution"] = {
+                value: round(count / total * 100, 1) for value, count in counts.items()
+            }
+        else:
+            profile[axis] = max(counts, key=counts.get)
+    
+    for axis, moments in stats["numeric"].items():
+        weight = moments["weight"]
+        if weight <= 0:
+            profile[axis] = None
+            continue
+        mean = moments["sum"] / weight
+        variance = max(moments["sum_sq"] / weight - mean * mean, 0.0)
+        profile[axis] = round(mean, 2)
+        profile[f"{axis}_min"] = round(moments["min"], 2)
+        profile[f"{axis}_max"] = round(moments["max"], 2)
+        profile[f"{axis}_std"] = round(variance ** 0.5, 2)
+    return profile
+
+def aggregate_user_profile(tone_axes_list, stats=None, clustering_options=None, clustering=None):
     """
     Aggregate tone_axes into a comprehensive user profile with clusters
     
     Args:
         tone_axes_list: List of tone_axes dictionaries from analyzed emails
+        stats: Optional running statistics (see update_profile_stats); when
+            given, the main profile reflects the user's whole history instead
+            of only this batch
+        clustering_options: Overrides for CLUSTERING_DEFAULTS, e.g.
+            {"warm_start": False} for the exhaustive n_init search
+        clustering: Precomputed ClusteringResult (see cluster_tone_axes_matrix)
+            to reuse instead of clustering again
         
     Returns:
         Dictionary with aggregated profile and clusters
@@ -383,10 +653,13 @@ def aggregate_user_profile(tone_axes_list):
         return {}
         
     # Create the main aggregated profile
-    main_profile = aggregate_tone_axes(tone_axes_list)
+    if stats is not None and stats.get("email_count"):
+        main_profile = profile_from_stats(stats)
+    else:
+        main_profile = aggregate_tone_axes(tone_axes_list)
     
     # Add advanced clustering information with automatic naming
-    clusters_info = advanced_cluster_tone_axes(tone_axes_list)
+    clusters_info = advanced_cluster_tone_axes(tone_axes_list, clustering_options, clustering)
     
     # Combine both into the final profile
     profile = {
@@ -394,5 +667,7 @@ def aggregate_user_profile(tone_axes_list):
         "style_clusters": clusters_info["clusters"],
         "email_count": len(tone_axes_list)
     }
+    if stats is not None:
+        profile["total_email_count"] = stats.get("email_count", 0)
     
-    return profile 
\ No newline at end of file
+    return profile
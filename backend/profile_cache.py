@@ -0,0 +1,135 @@
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from metrics import cache_lookup
+
+# Maximum number of JSON documents kept in memory
+PROFILE_CACHE_SIZE = int(os.getenv("WRITEWISE_PROFILE_CACHE_SIZE", 256))
+
+# Upper bound on the summed on-disk size of cached documents
+PROFILE_CACHE_MAX_BYTES = int(os.getenv("WRITEWISE_PROFILE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+class ProfileCache:
+    """
+    Process-level LRU cache of parsed JSON files such as profile.json.
+
+    Each entry remembers the file's mtime and size; a lookup costs one stat()
+    and the file is only re-parsed when either changed, so edits made by
+    other processes are still picked up. Writers in this process call put()
+    (or invalidate()) right after writing so the next read is a hit.
+    Cached documents are shared between requests and must not be mutated.
+    """
+
+    def __init__(self, max_entries=PROFILE_CACHE_SIZE, max_bytes=PROFILE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # path -> (mtime_ns, size, document)
+        self._listings = {}  # directory -> (mtime_ns, file names)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """
+        Parsed contents of a JSON file.
+
+        Returns:
+            The document, or None if the file does not exist
+
+        Raises:
+            ValueError: If the file is not valid JSON
+        """
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                cache_lookup("profile", True)
+                return entry[2]
+            self.misses += 1
+        cache_lookup("profile", False)
+
+        with open(path, "r", encoding="utf-8") as f:
+            document = json.load(f)
+        self._store(path, st, document)
+        return document
+
+    def put(self, path, document):
+        """Prime the cache with a document that was just written to path"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            return
+        self._store(path, st, document)
+
+    def invalidate(self, path):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def _store(self, path, st, document):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if st.st_size > self.max_bytes:
+                return
+            self._entries[path] = (st.st_mtime_ns, st.st_size, document)
+            self._bytes += st.st_size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, size, _) = self._entries.popitem(last=False)
+                self._bytes -= size
+
+    def list_files(self, directory, prefix, suffix=".json"):
+        """
+        Sorted names of files in directory matching prefix and suffix.
+
+        The directory listing is cached until the directory's mtime changes,
+        which happens whenever a file is added, removed or renamed in it.
+
+        Returns:
+            list: Matching file names (empty if the directory does not exist)
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            listing = self._listings.get(directory)
+        if listing is None or listing[0] != mtime:
+            listing = (mtime, sorted(os.listdir(directory)))
+            with self._lock:
+                if len(self._listings) >= self.max_entries:
+                    self._listings.clear()
+                self._listings[directory] = listing
+        return [name for name in listing[1] if name.startswith(prefix) and name.endswith(suffix)]
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._listings.clear()
+            self._bytes = 0
+        logging.info("Profile cache cleared")
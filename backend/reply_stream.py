@@ -0,0 +1,146 @@
+import json
+
+_SIMPLE_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+def iter_completion_text(response):
+    """
+    Yield the text deltas of a streamed chat completion as they arrive.
+
+    Args:
+        response: requests.Response of a request made with stream=True
+
+    Yields:
+        str: Content fragments in order
+    """
+    # chunk_size=None hands over each chunk of a chunked (streaming) response as soon as it
+    # is received instead of waiting for 512 bytes
+    for line in response.iter_lines(chunk_size=None):
+        if not line or not line.startswith(b"data:"):
+            continue
+        payload = line[len(b"data:"):].strip()
+        if payload == b"[DONE]":
+            break
+        try:
+            chunk = json.loads(payload)
+        except ValueError:
+            continue
+        choices = chunk.get("choices") or []
+        if choices:
+            text = (choices[0].get("delta") or {}).get("content")
+            if text:
+                yield text
+
+class IncrementalFieldParser:
+    """
+    Decodes selected string values of a JSON object while its text is still arriving.
+
+    Text before the first "{" is ignored (the model may explain its choice
+    before answering), as are nested values and non-string values. Escape
+    sequences, including \\uXXXX surrogate pairs, may be split across feeds.
+    The complete reply should still be parsed with json once it has arrived;
+    this only exists to show text early.
+    """
+
+    def __init__(self, fields):
+        """
+        Args:
+            fields: Names of the top-level keys whose values should be emitted
+        """
+        self.fields = set(fields)
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._string_field = None  # field being emitted, or None for keys and ignored strings
+        self._is_key = False
+        self._key_chars = []
+        self._escape = None  # pending escape sequence after the backslash
+        self._high_surrogate = None
+        self._expect_value = False
+        self._last_key = None
+
+    def feed(self, text):
+        """
+        Consume the next piece of text.
+
+        Returns:
+            list: (field, decoded text) pairs, in order
+        """
+        out = []
+        for ch in text:
+            if self._finished:
+                break
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._in_string:
+                self._string_char(ch, out)
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._is_key = self._depth == 1 and not self._expect_value
+                self._key_chars = []
+                emit = self._depth == 1 and self._expect_value and self._last_key in self.fields
+                self._string_field = self._last_key if emit else None
+            elif ch == ":":
+                self._expect_value = True
+            elif ch == ",":
+                self._expect_value = False
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finished = True
+        return self._merge(out)
+
+    def _string_char(self, ch, out):
+        if self._escape is not None:
+            self._escape += ch
+            if self._escape[0] == "u":
+                if len(self._escape) < 5:
+                    return
+                decoded = self._decode_unicode(int(self._escape[1:], 16))
+            else:
+                decoded = _SIMPLE_ESCAPES.get(self._escape, self._escape)
+            self._escape = None
+            if decoded:
+                self._append(decoded, out)
+        elif ch == "\\":
+            self._escape = ""
+        elif ch == '"':
+            self._in_string = False
+            if self._is_key:
+                self._last_key = "".join(self._key_chars)
+            else:
+                self._expect_value = False
+            self._string_field = None
+        else:
+            self._append(ch, out)
+
+    def _decode_unicode(self, code):
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+    def _append(self, text, out):
+        if self._is_key:
+            self._key_chars.append(text)
+        elif self._string_field is not None:
+            out.append((self._string_field, text))
+
+    @staticmethod
+    def _merge(pieces):
+        merged = []
+        for field, text in pieces:
+            if merged and merged[-1][0] == field:
+                merged[-1] = (field, merged[-1][1] + text)
+            else:
+                merged.append((field, text))
+        return merged
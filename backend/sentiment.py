@@ -0,0 +1,60 @@
+from spacy.tokens import Doc
+from textblob.en import sentiment as pattern_sentiment
+
+# Tokens spaCy splits off as infixes that TextBlob's tokenizer keeps inside a word
+_INFIXES = {"-", "/"}
+
+def _pattern_words(doc):
+    """
+    Lower-cased words of a Doc as TextBlob's tokenizer would split the same text.
+
+    spaCy and pattern mostly agree; the differences that change scores are
+    undone here: pattern keeps hyphenated words and "cannot" whole (the
+    lexicon has entries such as "open-minded") and splits contractions into
+    separate quote and letter tokens, so "n't" never acts as a negation.
+    """
+    words = []
+    glue = False
+    previous = None
+    for token in doc:
+        if token.is_space:
+            previous = None
+            continue
+        text = token.lower_
+        attached = previous is not None and not previous.whitespace_
+        if glue or (attached and text == "not" and previous.lower_ == "can"):
+            words[-1] += text
+            glue = False
+        elif attached and text in _INFIXES and not token.whitespace_ and token.i + 1 < len(doc) and words:
+            words[-1] += text
+            glue = True
+        elif text == "n't":
+            words.extend(("n", "'", "t"))
+        elif len(text) > 1 and text[0] == "'" and text[1:].isalpha():
+            words.extend(("'", text[1:]))
+        else:
+            words.append(text)
+        previous = token
+    return words
+
+def _average(assessments, index):
+    return sum(assessment[index] for assessment in assessments) / float(len(assessments) or 1)
+
+def doc_sentiment(doc):
+    """
+    Polarity and subjectivity of a parsed email.
+
+    Scores the Doc's tokens against TextBlob's pattern lexicon with the same
+    negation, modifier and emoticon rules as TextBlob(text).sentiment, so
+    the text is not tokenized a second time.
+
+    Returns:
+        tuple: (polarity in [-1, 1], subjectivity in [0, 1])
+    """
+    words = ((word, None) for word in _pattern_words(doc))
+    assessments = pattern_sentiment.assessments(words, negation=True)
+    return _average(assessments, 1), _average(assessments, 2)
+
+# Available as doc._.sentiment on every Doc, computed when first read
+if not Doc.has_extension("sentiment"):
+    Doc.set_extension("sentiment", getter=doc_sentiment)
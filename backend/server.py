@@ -1,4 +1,7 @@
-from flask import Flask, request, jsonify
+import time
+SERVER_STARTED_AT = time.time()
+
+from flask import Flask, Response, request, jsonify, stream_with_context, send_file, g
 from flask_cors import CORS
 import os
 import json
@@ -8,19 +11,25 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from feature_extraction import extract_email_features
-from tone_classification import classify_tone_axes
-from profile_aggregation import aggregate_user_profile
+# spaCy, sklearn and friends are imported on first use or by the warmup thread,
+# so the server accepts requests right away
+from feature_schema import FEATURE_SCHEMA_VERSION
+from tone_classification import classify_tone_axes, classify_tone_axes_batch, feature_columns
+from feature_pool import extract_features_parallel, start_feature_pool
+from feature_cache import FeatureCache, FEATURE_DISK_CACHE
+from feature_store import FeatureStore, feature_store_path
+from profile_cache import ProfileCache
+from jobs import JobQueue, QueueFullError
+from file_lock import file_lock
+from visualization import save_clustering, get_projection, get_visualization_png, latest_clustering_timestamp
+from warmup import start_warmup, warmup_status
+from metrics import timed, inc, observe, cache_lookup, REGISTRY, METRICS_ENABLED
 import subprocess
 import re
+import hashlib
+import threading
+import random
 import logging
-import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for server environment
 
 app = Flask(__name__)
 
@@ -43,200 +52,370 @@ if not os.path.exists(data_dir):
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+logging.info(f"Server module imported in {time.time() - SERVER_STARTED_AT:.2f}s")
+
+# Features of already analyzed bodies, shared across requests
+feature_cache = FeatureCache(FEATURE_SCHEMA_VERSION)
+
+# Emails analyzed per batch while an /analyze/stream upload is arriving
+STREAM_BATCH_SIZE = int(os.getenv('WRITEWISE_STREAM_BATCH_SIZE', 25))
+
+# Tone axes an /analyze/stream upload keeps in memory for clustering; larger uploads are clustered on a uniform sample
+STREAM_CLUSTER_SAMPLE = int(os.getenv('WRITEWISE_STREAM_CLUSTER_SAMPLE', 2000))
+
+# Half-life in days for weighting older emails in the running profile (unset: no decay)
+PROFILE_HALF_LIFE_DAYS = float(os.getenv('WRITEWISE_PROFILE_HALF_LIFE_DAYS', 0)) or None
+
+# Parsed profile.json and tone files, shared by /profile and /context
+profile_cache = ProfileCache()
+
+# Background /analyze?async=1 jobs; state files let any worker process answer /jobs/<id>
+analysis_jobs = JobQueue(state_dir=os.path.join(os.path.dirname(data_dir), 'jobs'))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed responses are measured up to the first byte, not until the stream ends
+    started = g.pop('request_started', None)
+    if started is not None and request.method != 'OPTIONS':
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe("writewise_http_request_seconds", time.perf_counter() - started,
+                endpoint=endpoint, method=request.method, status=response.status_code)
+        if request.content_length:
+            observe("writewise_payload_bytes", request.content_length, endpoint=endpoint)
+    return response
+
+class AnalysisError(Exception):
+    """Raised when an analysis cannot be completed; the message is safe to return to the client"""
+
+def should_include(email):
+    """Decide whether an email was written by the user and is worth analyzing"""
+    subject = email.get('subject', '')
+    body = email.get('body', '')
+    to_field = email.get('to', '')
+    
+    if not isinstance(subject, str):
+        subject = ''
+    if not isinstance(body, str):
+        body = ''
+    if not isinstance(to_field, str):
+        to_field = ''
+    
+    # Exclude if subject contains 'unsubscribe' (case-insensitive)
+    if 'unsubscribe' in subject.lower():
+        return False
+    
+    # Exclude if body contains 'unsubscribe' (case-insensitive)
+    if 'unsubscribe' in body.lower():
+        return False
+    
+    # Exclude if 'to' field contains 'unsubscribe' (case-insensitive)
+    if 'unsubscribe' in to_field.lower():
+        return False
+    
+    # Exclude if body is blank or only whitespace
+    if body.strip() == '':
+        return False
+    
+    # Exclude if body starts with any whitespace or '>' followed by a line break
+    if re.match(r'^[\s>]*(\r\n|\n|\r)', body):
+        return False
+        
+    # Exclude replies by checking for common reply indicators
+    if subject.lower().startswith('re:'):
+        return False
+        
+    # Exclude forwarded messages
+    if subject.lower().startswith('fwd:') or subject.lower().startswith('fw:'):
+        return False
+        
+    # Check for quoted text patterns in the body
+    if '>' in body and re.search(r'\n>[^\n]*\n', body):
+        return False
+        
+    # Check for common forwarded message markers
+    forwarded_patterns = [
+        r'[-]+ ?forwarded message ?[-]+',
+        r'begin forwarded message',
+        r'original message',
+        r'from:.*wrote:',
+        r'on .* wrote:',
+        r'on .* at .* wrote:'
+    ]
+    
+    for pattern in forwarded_patterns:
+        if re.search(pattern, body.lower()):
+            return False
+    
+    return True
 
-def generate_cluster_visualization(user_dir, tone_axes_list, user_id, timestamp):
+def select_emails(all_emails):
     """
-    Generates a visualization of tone clusters reduced to 2 principal components.
+    Filter the submitted emails and pad the result to exactly 100 emails.
     
     Args:
-        user_dir: Directory to save the visualization
-        tone_axes_list: List of tone classification results
-        user_id: User identifier
-        timestamp: Current timestamp string
+        all_emails: List of email dicts as sent by the extension
+        
+    Returns:
+        list: 100 email dicts
+    """
+    filtered_emails = []
+    batch_size = 50
+    i = 0
+    while i < len(all_emails) and len(filtered_emails) < 100:
+        batch = all_emails[i:i+batch_size]
+        filtered_emails = [email for email in (filtered_emails + batch) if should_include(email)]
+        if len(filtered_emails) > 100:
+            filtered_emails = filtered_emails[:100]
+        i += batch_size
+    # Always output exactly 100 emails
+    if len(filtered_emails) == 0:
+        empty_email = {"subject": "", "body": "", "to": "", "from": "", "date": "", "id": ""}
+        logging.info("No emails passed filtering; filled with empty emails.")
+        return [empty_email.copy() for _ in range(100)]
+    repeated = (filtered_emails * ((100 // len(filtered_emails)) + 1))[:100]
+    logging.info(f"Filtered {len(filtered_emails)} emails, repeated to 100.")
+    return repeated
+
+def email_key(email):
+    """Stable key identifying an email across uploads: its id, or a hash of its body"""
+    email_id = email.get('id')
+    if email_id:
+        return f"id:{email_id}"
+    body = email.get('body', '')
+    if not isinstance(body, str):
+        body = ''
+    return "body:" + hashlib.sha1(body.encode('utf-8', 'surrogatepass')).hexdigest()
+
+def update_user_profile_stats(user_dir, tone_axes_list, email_keys):
+    """
+    Merge a batch into the user's running profile statistics on disk.
     
     Returns:
-        str: Path to the generated visualization file
+        dict or None if the statistics could not be updated
     """
-    # Skip if we don't have at least 2 data points
-    if not tone_axes_list or len(tone_axes_list) < 2:
-        logging.warning("Not enough data points for clustering visualization")
+    from profile_aggregation import new_profile_stats, update_profile_stats
+    stats_filename = os.path.join(user_dir, 'profile_stats.json')
+    try:
+        # Held across server worker processes, which may update the same user at once
+        with file_lock(stats_filename):
+            stats = new_profile_stats()
+            if os.path.exists(stats_filename):
+                with open(stats_filename, 'r', encoding='utf-8') as f:
+                    stats = json.load(f)
+            update_profile_stats(stats, tone_axes_list, keys=email_keys, half_life_days=PROFILE_HALF_LIFE_DAYS)
+            tmp_filename = f'{stats_filename}.{threading.get_ident()}.tmp'
+            with open(tmp_filename, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, ensure_ascii=False)
+            os.replace(tmp_filename, stats_filename)
+        return stats
+    except Exception as stats_err:
+        logging.error(f"Failed to update profile statistics: {stats_err}")
         return None
+
+def get_user_id(data):
+    user_id = data.get('user_id', 'anonymous')
+    if not isinstance(user_id, str):
+        user_id = 'anonymous'
+    return user_id
+
+def analyze_emails(emails, user_dir):
+    """
+    Extract features and tone axes for every email, keeping index alignment.
     
-    try:
-        # Extract features for clustering
-        features = []
-        
-        # Define which tone axes to use for clustering
-        tone_dimensions = [
-            'formality', 'politeness', 'certainty', 'emotion', 
-            'greeting_score', 'closing_score', 'emoji_score', 
-            'directness', 'subjectivity'
-        ]
-        
-        # Collect numeric values
-        for tone in tone_axes_list:
-            if not tone:  # Skip empty entries
-                continue
-                
-            # Extract numeric values for each dimension
-            # Convert categorical dimensions to numeric values
-            tone_features = []
-            
-            # Formality: formal=2, neutral=1, informal=0
-            formality = tone.get('formality', 'neutral')
-            if formality == 'formal':
-                tone_features.append(2)
-            elif formality == 'neutral':
-                tone_features.append(1)
-            else:
-                tone_features.append(0)
-                
-            # Politeness: polite=2, neutral=1, impolite=0
-            politeness = tone.get('politeness', 'neutral')
-            if politeness == 'polite':
-                tone_features.append(2)
-            elif politeness == 'neutral':
-                tone_features.append(1)
-            else:
-                tone_features.append(0)
-                
-            # Certainty: confident=2, balanced=1, hedged=0
-            certainty = tone.get('certainty', 'balanced')
-            if certainty == 'confident':
-                tone_features.append(2)
-            elif certainty == 'balanced':
-                tone_features.append(1)
-            else:
-                tone_features.append(0)
-                
-            # Emotion: positive=2, neutral=1, negative=0
-            emotion = tone.get('emotion', 'neutral')
-            if emotion == 'positive':
-                tone_features.append(2)
-            elif emotion == 'neutral':
-                tone_features.append(1)
-            else:
-                tone_features.append(0)
-                
-            # Presence dimensions: map present=1, absent=0
-            greeting = tone.get('greeting', 'absent')
-            tone_features.append(1 if greeting == 'present' else 0)
-            
-            closing = tone.get('closing', 'absent')
-            tone_features.append(1 if closing == 'present' else 0)
-            
-            # Emoji usage: high=2, some=1, none=0
-            emoji_usage = tone.get('emoji_usage', 'none')
-            if emoji_usage == 'high':
-                tone_features.append(2)
-            elif emoji_usage == 'some':
-                tone_features.append(1)
-            else:
-                tone_features.append(0)
-                
-            # Directness: direct=1, indirect=0
-            directness = tone.get('directness', 'direct')
-            tone_features.append(1 if directness == 'direct' else 0)
-            
-            # Subjectivity: personal=1, objective=0
-            subjectivity = tone.get('subjectivity_level', 'objective')
-            tone_features.append(1 if subjectivity == 'personal' else 0)
-            
-            features.append(tone_features)
-        
-        # Skip if not enough valid entries
-        if len(features) < 2:
-            logging.warning("Not enough valid entries for clustering visualization")
-            return None
-            
-        # Convert to numpy array
-        X = np.array(features)
-        
-        # Standardize features
-        X_scaled = StandardScaler().fit_transform(X)
-        
-        # Apply PCA to reduce to 2 dimensions
-        pca = PCA(n_components=2)
-        principal_components = pca.fit_transform(X_scaled)
+    Emails that fail analysis get empty dicts in both lists.
+    
+    Returns:
+        tuple: (features_list, tone_axes_list)
+    """
+    features_list = []
+    error_count = 0
+    
+    bodies = [email.get('body', '') for email in emails]
+    cache_dir = os.path.join(user_dir, 'cache', 'features') if FEATURE_DISK_CACHE else None
+    batch_results = feature_cache.extract_many(bodies, extract_features_parallel, cache_dir)
+    
+    for idx, (email, features) in enumerate(zip(emails, batch_results)):
+        email_id = email.get('id', f'email_{idx}')
+        short_id = str(email_id)[:8]  # Only log a short part of the ID for privacy
+        body = bodies[idx]
+        
+        # Don't log the full body, just log a length for debugging
+        body_length = len(body) if body else 0
+        
+        if isinstance(features, Exception):
+            error_count += 1
+            inc("writewise_email_errors_total", stage="features")
+            logging.error(f"Error analyzing email {short_id}, length={body_length}: {features}")
+            # Add empty results to maintain index alignment
+            features_list.append({})
+        else:
+            features_list.append(features)
+            logging.debug(f"Successfully analyzed email {short_id}, length={body_length}")
+    
+    # Classify every email in one vectorized pass; failed emails come back as empty dicts
+    with timed("tone_classification"):
+        tone_axes_list = classify_tone_axes_batch(feature_columns(features_list)).to_list()
+    
+    if error_count > 0:
+        logging.warning(f"{error_count} out of {len(emails)} emails failed analysis")
+    return features_list, tone_axes_list
+
+def run_analysis(data, user_id, timestamp, progress=None):
+    """
+    Run the full analysis pipeline for an /analyze request.
+    
+    Args:
+        data: Request payload whose 'emails' have already been selected
+        user_id: User identifier
+        timestamp: Timestamp string used in all output file names
+        progress: Optional callback taking (stage, percent)
         
-        # Determine number of clusters (between 2 and 5)
-        max_clusters = min(5, len(X))
-        min_clusters = 2
+    Returns:
+        dict: Response payload with the aggregated profile
         
-        # Use KMeans to identify clusters
-        optimal_k = 3  # Default to 3 clusters
+    Raises:
+        AnalysisError: If the analysis cannot be saved
+    """
+    def report(stage, percent):
+        if progress:
+            progress(stage, percent)
+    
+    safe_user_id = user_id.replace('@', '_').replace('.', '_')
+    user_dir = os.path.join(data_dir, safe_user_id)
+    os.makedirs(user_dir, exist_ok=True)
+    
+    # Create analysis directory if it doesn't exist
+    analysis_dir = os.path.join(user_dir, "analysis")
+    os.makedirs(analysis_dir, exist_ok=True)
+    
+    data_filename = os.path.join(analysis_dir, f'data_{timestamp}.json')
+    
+    # Save the raw data to a file
+    report('saving', 5)
+    try:
+        with timed("file_write"), open(data_filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    except Exception as file_err:
+        logging.error(f"Failed to save data file: {file_err}")
+        raise AnalysisError('Failed to save data file.') from file_err
+    # --- Modular Tone Analysis Pipeline ---
+    report('extracting', 10)
+    emails = data.get('emails', [])
+    features_list, tone_axes_list = analyze_emails(emails, user_dir)
+
+    report('saving', 70)
+    try:
+        with timed("file_write"):
+            FeatureStore(feature_store_path(user_dir)).append(features_list, timestamp)
+    except Exception as file_err:
+        logging.error(f"Failed to save features: {file_err}")
         
-        # Try to find optimal number of clusters using elbow method
+    email_keys = [email_key(email) for email in emails]
+    return finish_analysis(user_dir, user_id, timestamp, tone_axes_list, email_keys, progress)
+
+def finish_analysis(user_dir, user_id, timestamp, tone_axes_list, email_keys, progress=None,
+                    stats=None, email_count=None):
+    """
+    Save tone axes, aggregate and save the profile, and keep the clustering for plotting.
+    
+    The main profile is built from the user's running statistics, so it covers
+    every email analyzed so far; email_keys (aligned with tone_axes_list)
+    keep repeated or re-posted emails from being counted twice.
+    
+    Args:
+        stats: Running statistics the caller already merged these emails
+            into (see analyze_stream). The tone axes are then taken as saved
+            too, and tone_axes_list may be a sample used only for clustering.
+        email_count: Number of emails analyzed when tone_axes_list is a sample
+    
+    Returns:
+        dict: Response payload with the aggregated profile
+    """
+    from profile_aggregation import aggregate_user_profile, cluster_tone_axes_matrix
+    
+    def report(stage, percent):
+        if progress:
+            progress(stage, percent)
+    
+    safe_user_id = os.path.basename(user_dir)
+    analysis_dir = os.path.join(user_dir, "analysis")
+    tone_filename = os.path.join(analysis_dir, f'tone_{timestamp}.json')
+    
+    tone_axes_filename = os.path.join(analysis_dir, f'tone_axes_{timestamp}.json')
+    if stats is None:
         try:
-            distortions = []
-            K_range = range(min_clusters, max_clusters + 1)
-            for k in K_range:
-                kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-                kmeans.fit(X_scaled)
-                distortions.append(kmeans.inertia_)
-                
-            # Simple elbow method: look for the "elbow" in the curve
-            deltas = np.diff(distortions)
-            # If the second derivative is at maximum, it's likely the elbow point
-            if len(deltas) > 1:
-                acceleration = np.diff(deltas)
-                optimal_idx = np.argmax(acceleration) + 1
-                optimal_k = K_range[optimal_idx]
-        except Exception as e:
-            logging.error(f"Error determining optimal clusters: {e}")
-        
-        # Apply KMeans with the determined number of clusters
-        kmeans = KMeans(n_clusters=optimal_k, random_state=42, n_init=10)
-        clusters = kmeans.fit_predict(X_scaled)
-        
-        # Create the visualization
-        plt.figure(figsize=(10, 8))
-        scatter = plt.scatter(principal_components[:, 0], principal_components[:, 1], 
-                   c=clusters, cmap='viridis', s=100, alpha=0.8)
-        
-        # Add centroids
-        centroids_pca = pca.transform(kmeans.cluster_centers_)
-        plt.scatter(centroids_pca[:, 0], centroids_pca[:, 1], 
-                   marker='X', s=200, color='red', label='Centroids')
-        
-        # Add styling and information
-        plt.title(f'Email Style Clusters ({optimal_k} Clusters Identified)', fontsize=16)
-        plt.xlabel(f'Principal Component 1 ({pca.explained_variance_ratio_[0]:.2%} variance)', fontsize=14)
-        plt.ylabel(f'Principal Component 2 ({pca.explained_variance_ratio_[1]:.2%} variance)', fontsize=14)
-        plt.colorbar(scatter, label='Cluster')
-        plt.legend()
-        plt.grid(alpha=0.3)
-        
-        # Add feature contribution arrows
-        if pca.components_.shape[1] == len(tone_dimensions):
-            # Scale the feature arrows to fit nicely on the plot
-            scale = 2  
-            for i, feature in enumerate(tone_dimensions):
-                plt.arrow(0, 0, 
-                        pca.components_[0, i] * scale, 
-                        pca.components_[1, i] * scale,
-                        head_width=0.1, head_length=0.1, fc='blue', ec='blue', alpha=0.5)
-                plt.text(pca.components_[0, i] * scale * 1.15, 
-                       pca.components_[1, i] * scale * 1.15,
-                       feature, fontsize=12)
-        
-        # Save the figure
-        viz_dir = os.path.join(user_dir, 'analysis', 'visualizations')
-        os.makedirs(viz_dir, exist_ok=True)
-        viz_file = os.path.join(viz_dir, f'clusters_{timestamp}.png')
-        plt.tight_layout()
-        plt.savefig(viz_file, dpi=300)
-        plt.close()
-        
-        logging.info(f"Generated cluster visualization with {optimal_k} clusters")
-        
-        return viz_file
-        
+            with timed("file_write"), open(tone_axes_filename, 'w', encoding='utf-8') as f:
+                json.dump(tone_axes_list, f, indent=2, ensure_ascii=False)
+        except Exception as file_err:
+            logging.error(f"Failed to save tone axes file: {file_err}")
+    # Cluster once; the profile and the visualization share the result
+    report('clustering', 75)
+    try:
+        with timed("clustering"):
+            clustering = cluster_tone_axes_matrix(tone_axes_list)
+    except Exception as cluster_err:
+        logging.error(f"Failed to cluster tone axes: {cluster_err}")
+        clustering = None
+    # Aggregate user profile
+    report('aggregating', 80)
+    try:
+        if stats is None:
+            stats = update_user_profile_stats(user_dir, tone_axes_list, email_keys)
+        with timed("aggregation"):
+            user_profile = aggregate_user_profile(tone_axes_list, stats=stats, clustering=clustering)
+        if user_profile and email_count is not None:
+            user_profile["email_count"] = email_count
+        profile_filename = os.path.join(user_dir, 'profile.json')
+        tmp_filename = f'{profile_filename}.{threading.get_ident()}.tmp'
+        with timed("file_write"):
+            with open(tmp_filename, 'w', encoding='utf-8') as f:
+                json.dump(user_profile, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_filename, profile_filename)
+        profile_cache.put(profile_filename, user_profile)
+    except Exception as agg_err:
+        logging.error(f"Failed to aggregate or save user profile: {agg_err}")
+        user_profile = {}
+    # For backward compatibility, save the last tone axes as tone_features
+    if tone_axes_list and email_count is None:
+        try:
+            with open(tone_filename, 'w', encoding='utf-8') as f:
+                json.dump(tone_axes_list[-1], f, indent=2, ensure_ascii=False)
+        except Exception as file_err:
+            logging.error(f"Failed to save tone file: {file_err}")
+    logging.info(f"Analysis complete for user_id={user_id}, timestamp={timestamp}")
+    
+    response_data = {
+        'status': 'success',
+        'message': 'Analysis complete and data saved.',
+        'profile': user_profile
+    }
+    
+    # Keep the clustering so /visualization can render it on demand
+    report('saving clusters', 85)
+    if clustering is not None and len(tone_axes_list) >= 2 and clustering.matrix.shape[1] >= 2:
+        try:
+            save_clustering(user_dir, timestamp, clustering)
+            response_data['visualization'] = f'/visualization?user_id={safe_user_id}&ts={timestamp}'
+        except Exception as viz_err:
+            logging.error(f"Failed to save clustering: {viz_err}")
+    
+    return response_data
+
+def run_analysis_job(data, user_id, timestamp, progress=None):
+    """run_analysis for background jobs; failures surface only client-safe messages"""
+    try:
+        return run_analysis(data, user_id, timestamp, progress=progress)
+    except AnalysisError:
+        raise
     except Exception as e:
-        logging.error(f"Error generating cluster visualization: {e}")
         import traceback
-        logging.error(traceback.format_exc())
-        return None
+        logging.error(f'Exception in analysis job: {e}')
+        logging.debug(f'Traceback: {traceback.format_exc()}')
+        raise AnalysisError('An internal error occurred. Please try again later.') from e
 
 @app.route('/analyze', methods=['POST', 'OPTIONS'])
 def analyze():
@@ -247,195 +426,28 @@ def analyze():
         if not data or 'emails' not in data or not isinstance(data['emails'], list):
             logging.warning("Invalid input: 'emails' field missing or not a list.")
             return jsonify({'status': 'error', 'message': "Invalid input: 'emails' field missing or not a list."}), 400
-        # --- Filtering logic ---
-        def should_include(email):
-            subject = email.get('subject', '')
-            body = email.get('body', '')
-            to_field = email.get('to', '')
-            
-            if not isinstance(subject, str):
-                subject = ''
-            if not isinstance(body, str):
-                body = ''
-            if not isinstance(to_field, str):
-                to_field = ''
-            
-            # Exclude if subject contains 'unsubscribe' (case-insensitive)
-            if 'unsubscribe' in subject.lower():
-                return False
-            
-            # Exclude if body contains 'unsubscribe' (case-insensitive)
-            if 'unsubscribe' in body.lower():
-                return False
-            
-            # Exclude if 'to' field contains 'unsubscribe' (case-insensitive)
-            if 'unsubscribe' in to_field.lower():
-                return False
-            
-            # Exclude if body is blank or only whitespace
-            if body.strip() == '':
-                return False
-            
-            # Exclude if body starts with any whitespace or '>' followed by a line break
-            if re.match(r'^[\s>]*(\r\n|\n|\r)', body):
-                return False
-                
-            # Exclude replies by checking for common reply indicators
-            if subject.lower().startswith('re:'):
-                return False
-                
-            # Exclude forwarded messages
-            if subject.lower().startswith('fwd:') or subject.lower().startswith('fw:'):
-                return False
-                
-            # Check for quoted text patterns in the body
-            if '>' in body and re.search(r'\n>[^\n]*\n', body):
-                return False
-                
-            # Check for common forwarded message markers
-            forwarded_patterns = [
-                r'[-]+ ?forwarded message ?[-]+',
-                r'begin forwarded message',
-                r'original message',
-                r'from:.*wrote:',
-                r'on .* wrote:',
-                r'on .* at .* wrote:'
-            ]
-            
-            for pattern in forwarded_patterns:
-                if re.search(pattern, body.lower()):
-                    return False
-            
-            return True
-        all_emails = data['emails']
-        filtered_emails = []
-        batch_size = 50
-        i = 0
-        while i < len(all_emails) and len(filtered_emails) < 100:
-            batch = all_emails[i:i+batch_size]
-            filtered_emails = [email for email in (filtered_emails + batch) if should_include(email)]
-            if len(filtered_emails) > 100:
-                filtered_emails = filtered_emails[:100]
-            i += batch_size
-        # Always output exactly 100 emails
-        if len(filtered_emails) == 0:
-            empty_email = {"subject": "", "body": "", "to": "", "from": "", "date": "", "id": ""}
-            data['emails'] = [empty_email.copy() for _ in range(100)]
-            logging.info("No emails passed filtering; filled with empty emails.")
-        else:
-            repeated = (filtered_emails * ((100 // len(filtered_emails)) + 1))[:100]
-            data['emails'] = repeated
-            logging.info(f"Filtered {len(filtered_emails)} emails, repeated to 100.")
-        # --- End filtering logic ---
+        data['emails'] = select_emails(data['emails'])
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        user_id = data.get('user_id', 'anonymous')
-        if not isinstance(user_id, str):
-            user_id = 'anonymous'
-        safe_user_id = user_id.replace('@', '_').replace('.', '_')
-        user_dir = os.path.join(data_dir, safe_user_id)
-        os.makedirs(user_dir, exist_ok=True)
-        
-        # Create analysis directory if it doesn't exist
-        analysis_dir = os.path.join(user_dir, "analysis")
-        os.makedirs(analysis_dir, exist_ok=True)
-        
-        data_filename = os.path.join(analysis_dir, f'data_{timestamp}.json')
-        tone_filename = os.path.join(analysis_dir, f'tone_{timestamp}.json')
-        
-        # Save the raw data to a file
-        try:
-            with open(data_filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-        except Exception as file_err:
-            logging.error(f"Failed to save data file: {file_err}")
-            return jsonify({'status': 'error', 'message': 'Failed to save data file.'}), 500
-        # --- Modular Tone Analysis Pipeline ---
-        emails = data.get('emails', [])
-        features_list = []
-        tone_axes_list = []
-        error_count = 0
-        
-        for idx, email in enumerate(emails):
-            email_id = email.get('id', f'email_{idx}')
-            short_id = str(email_id)[:8]  # Only log a short part of the ID for privacy
-            body = email.get('body', '')
-            
-            # Don't log the full body, just log a length for debugging
-            body_length = len(body) if body else 0
-            
-            try:
-                features = extract_email_features(body)
-                features_list.append(features)
-                tone_axes = classify_tone_axes(features)
-                tone_axes_list.append(tone_axes)
-                logging.debug(f"Successfully analyzed email {short_id}, length={body_length}")
-            except Exception as analysis_err:
-                error_count += 1
-                logging.error(f"Error analyzing email {short_id}, length={body_length}: {analysis_err}")
-                # Add empty results to maintain index alignment
-                features_list.append({})
-                tone_axes_list.append({})
+        user_id = get_user_id(data)
         
-        if error_count > 0:
-            logging.warning(f"{error_count} out of {len(emails)} emails failed analysis")
-
-        features_filename = os.path.join(analysis_dir, f'features_{timestamp}.json')
-        try:
-            with open(features_filename, 'w', encoding='utf-8') as f:
-                json.dump(features_list, f, indent=2, ensure_ascii=False)
-        except Exception as file_err:
-            logging.error(f"Failed to save features file: {file_err}")
-            
-        tone_axes_filename = os.path.join(analysis_dir, f'tone_axes_{timestamp}.json')
-        try:
-            with open(tone_axes_filename, 'w', encoding='utf-8') as f:
-                json.dump(tone_axes_list, f, indent=2, ensure_ascii=False)
-        except Exception as file_err:
-            logging.error(f"Failed to save tone axes file: {file_err}")
-        # Aggregate user profile
-        try:
-            user_profile = aggregate_user_profile(tone_axes_list)
-            profile_filename = os.path.join(user_dir, 'profile.json')
-            with open(profile_filename, 'w', encoding='utf-8') as f:
-                json.dump(user_profile, f, indent=2, ensure_ascii=False)
-        except Exception as agg_err:
-            logging.error(f"Failed to aggregate or save user profile: {agg_err}")
-            user_profile = {}
-        # For backward compatibility, save the last tone axes as tone_features
-        if tone_axes_list:
+        # ?async=1 queues the analysis and returns a job ID to poll on /jobs/<id>
+        if request.args.get('async') in ('1', 'true'):
             try:
-                with open(tone_filename, 'w', encoding='utf-8') as f:
-                    json.dump(tone_axes_list[-1], f, indent=2, ensure_ascii=False)
-            except Exception as file_err:
-                logging.error(f"Failed to save tone file: {file_err}")
-        logging.info(f"Analysis complete for user_id={user_id}, timestamp={timestamp}")
+                job_id = analysis_jobs.submit(run_analysis_job, data, user_id, timestamp)
+            except QueueFullError as queue_err:
+                logging.warning(f"Rejected async analysis: {queue_err}")
+                return jsonify({'status': 'error', 'message': 'Too many analyses in progress. Please try again later.'}), 503
+            logging.info(f"Queued analysis job {job_id[:8]} for user_id={user_id}")
+            return jsonify({
+                'status': 'accepted',
+                'job_id': job_id,
+                'status_url': f'/jobs/{job_id}'
+            }), 202
         
-        # Generate and save cluster visualization
         try:
-            viz_file = generate_cluster_visualization(user_dir, tone_axes_list, safe_user_id, timestamp)
-            if viz_file:
-                logging.info(f"Saved cluster visualization to {os.path.basename(viz_file)}")
-                # Add visualization path to response
-                response_data = {
-                    'status': 'success',
-                    'message': 'Analysis complete and data saved.',
-                    'profile': user_profile,
-                    'visualization': os.path.basename(viz_file)
-                }
-            else:
-                response_data = {
-                    'status': 'success',
-                    'message': 'Analysis complete and data saved.',
-                    'profile': user_profile
-                }
-        except Exception as viz_err:
-            logging.error(f"Error with visualization: {viz_err}")
-            response_data = {
-                'status': 'success',
-                'message': 'Analysis complete and data saved.',
-                'profile': user_profile
-            }
-        
+            response_data = run_analysis(data, user_id, timestamp)
+        except AnalysisError as analysis_err:
+            return jsonify({'status': 'error', 'message': str(analysis_err)}), 500
         return jsonify(response_data)
     except Exception as e:
         import traceback
@@ -447,18 +459,240 @@ def analyze():
             'message': 'An internal error occurred. Please try again later.'
         }), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    response_data = {
+        'status': 'success',
+        'job_id': job_id,
+        'state': job['status'],
+        'stage': job['stage'],
+        'percent': job['percent']
+    }
+    if job['status'] == 'done':
+        response_data['result'] = job['result']
+    elif job['status'] == 'failed':
+        response_data['error'] = job['error']
+    return jsonify(response_data)
+
+@app.route('/analyze/stream', methods=['POST', 'OPTIONS'])
+def analyze_stream():
+    """
+    Streaming variant of /analyze for large mailboxes.
+    
+    The request body is newline-delimited JSON: one email object per line,
+    optionally preceded by a {"user_id": ...} header line (user_id may also be
+    passed as a query parameter). Emails are filtered, preprocessed and
+    analyzed in small batches while the upload is still arriving, and the
+    response streams NDJSON progress events followed by a final "done" event
+    holding the same payload /analyze returns. Each batch is folded into the
+    running profile statistics and appended to the saved tone axes as soon as
+    it is analyzed; only a uniform sample of at most STREAM_CLUSTER_SAMPLE
+    tone axes is kept for clustering, so memory stays flat in the number of
+    emails.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    query_user_id = request.args.get('user_id')
+    
+    def event(payload):
+        return json.dumps(payload, ensure_ascii=False) + '\n'
+    
+    def generate():
+        user_id = query_user_id or 'anonymous'
+        user_dir = None
+        data_file = tone_axes_file = feature_store = None
+        received = accepted = skipped = analyzed = 0
+        pending = []
+        pending_keys = []
+        # Reservoir sample of the analyzed tone axes, used only for clustering
+        sample = []
+        rng = random.Random(timestamp)
+        stats = last_tone_axes = None
+        
+        def open_outputs():
+            nonlocal user_dir, data_file, tone_axes_file, feature_store
+            safe_user_id = user_id.replace('@', '_').replace('.', '_')
+            user_dir = os.path.join(data_dir, safe_user_id)
+            analysis_dir = os.path.join(user_dir, 'analysis')
+            os.makedirs(analysis_dir, exist_ok=True)
+            data_file = open(os.path.join(analysis_dir, f'data_{timestamp}.ndjson'), 'w', encoding='utf-8')
+            tone_axes_file = open(os.path.join(analysis_dir, f'tone_axes_{timestamp}.json'), 'w', encoding='utf-8')
+            tone_axes_file.write('[')
+            feature_store = FeatureStore(feature_store_path(user_dir))
+        
+        def flush():
+            nonlocal analyzed, stats, last_tone_axes
+            features_list, batch_tone_axes = analyze_emails(pending, user_dir)
+            feature_store.append(features_list, timestamp)
+            stats = update_user_profile_stats(user_dir, batch_tone_axes, pending_keys) or stats
+            for tone_axes in batch_tone_axes:
+                tone_axes_file.write((',\n' if analyzed else '\n') + json.dumps(tone_axes, ensure_ascii=False))
+                analyzed += 1
+                if len(sample) < STREAM_CLUSTER_SAMPLE:
+                    sample.append(tone_axes)
+                else:
+                    slot = rng.randrange(analyzed)
+                    if slot < STREAM_CLUSTER_SAMPLE:
+                        sample[slot] = tone_axes
+            last_tone_axes = batch_tone_axes[-1]
+            pending.clear()
+            pending_keys.clear()
+        
+        def progress_event():
+            return event({'event': 'progress', 'received': received, 'accepted': accepted,
+                          'skipped': skipped, 'analyzed': analyzed})
+        
+        try:
+            for raw_line in request.stream:
+                line = raw_line.strip()
+                if not line:
+                    continue
+                try:
+                    email = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if not isinstance(email, dict):
+                    skipped += 1
+                    continue
+                # Header line carrying the user id
+                if received == 0 and accepted == 0 and 'user_id' in email and 'body' not in email:
+                    if not query_user_id:
+                        user_id = get_user_id(email)
+                    continue
+                
+                received += 1
+                if not should_include(email):
+                    continue
+                if data_file is None:
+                    open_outputs()
+                accepted += 1
+                data_file.write(json.dumps(email, ensure_ascii=False) + '\n')
+                pending.append(email)
+                pending_keys.append(email_key(email))
+                if len(pending) >= STREAM_BATCH_SIZE:
+                    flush()
+                    yield progress_event()
+            
+            if data_file is None:
+                yield event({'event': 'error', 'message': 'No emails passed filtering.',
+                             'received': received, 'skipped': skipped})
+                return
+            if pending:
+                flush()
+            yield progress_event()
+            
+            data_file.close()
+            tone_axes_file.write('\n]\n')
+            tone_axes_file.close()
+            tone_filename = os.path.join(user_dir, 'analysis', f'tone_{timestamp}.json')
+            with open(tone_filename, 'w', encoding='utf-8') as f:
+                json.dump(last_tone_axes, f, indent=2, ensure_ascii=False)
+            
+            if stats is None:
+                from profile_aggregation import new_profile_stats, update_profile_stats
+                stats = update_profile_stats(new_profile_stats(), sample)
+            response_data = finish_analysis(user_dir, user_id, timestamp, sample, None,
+                                            stats=stats, email_count=analyzed)
+            yield event({'event': 'done', 'result': response_data})
+        except Exception as e:
+            import traceback
+            logging.error(f'Exception in /analyze/stream endpoint: {e}')
+            logging.debug(f'Traceback: {traceback.format_exc()}')
+            yield event({'event': 'error', 'message': 'An internal error occurred. Please try again later.'})
+        finally:
+            for f in (data_file, tone_axes_file):
+                if f is not None and not f.closed:
+                    f.close()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/profile', methods=['GET'])
 def get_profile():
     user_id = request.args.get('user_id', 'anonymous')
     safe_user_id = user_id.replace('@', '_').replace('.', '_')
     user_dir = os.path.join(data_dir, safe_user_id)
     profile_filename = os.path.join(user_dir, 'profile.json')
-    if not os.path.exists(profile_filename):
+    profile = profile_cache.get(profile_filename)
+    if profile is None:
         return jsonify({'status': 'error', 'message': 'Profile not found'}), 404
-    with open(profile_filename, 'r', encoding='utf-8') as f:
-        profile = json.load(f)
     return jsonify({'status': 'success', 'profile': profile})
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness and readiness.
+    
+    Always 200 while the process serves requests; "ready" turns true once the
+    warmup has imported the models. With ?ready=1 the status is 503 until then,
+    for use as a load balancer readiness probe.
+    """
+    status = warmup_status()
+    payload = {
+        'status': 'ok',
+        'live': True,
+        'ready': status['ready'],
+        'import_seconds': status['import_seconds'],
+        'uptime_seconds': round(time.time() - SERVER_STARTED_AT, 1),
+    }
+    if status['error']:
+        payload['error'] = status['error']
+    code = 503 if request.args.get('ready') == '1' and not status['ready'] else 200
+    return jsonify(payload), code
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the in-process caches"""
+    return jsonify({
+        'status': 'success',
+        'profile_cache': profile_cache.stats(),
+        'feature_cache': {'hits': feature_cache.hits, 'misses': feature_cache.misses}
+    })
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Stage latencies, request latencies, payload sizes and cache counters in Prometheus text format"""
+    if not METRICS_ENABLED:
+        return jsonify({'status': 'error', 'message': 'Metrics are disabled'}), 404
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/visualization', methods=['GET'])
+def get_visualization():
+    """
+    Cluster plot for an analysis, rendered on first request and cached on disk.
+
+    Query params: user_id, ts (analysis timestamp, defaults to the latest) and
+    format=png|json. The JSON variant returns PCA coordinates, centroids and
+    feature loadings so the client can draw the plot itself.
+    """
+    user_id = request.args.get('user_id', 'anonymous')
+    safe_user_id = user_id.replace('@', '_').replace('.', '_')
+    user_dir = os.path.join(data_dir, safe_user_id)
+    timestamp = request.args.get('ts') or latest_clustering_timestamp(user_dir)
+    if not timestamp or not re.fullmatch(r'\d{8}_\d{6}', timestamp):
+        return jsonify({'status': 'error', 'message': 'Visualization not found'}), 404
+    fmt = request.args.get('format', 'png')
+    try:
+        if fmt == 'json':
+            projection = get_projection(user_dir, timestamp)
+            if projection is None:
+                return jsonify({'status': 'error', 'message': 'Visualization not found'}), 404
+            return jsonify({'status': 'success', 'timestamp': timestamp, 'projection': projection})
+        if fmt != 'png':
+            return jsonify({'status': 'error', 'message': 'format must be png or json'}), 400
+        png_path = get_visualization_png(user_dir, timestamp)
+    except Exception as e:
+        logging.error(f"Failed to build visualization for {timestamp}: {e}")
+        return jsonify({'status': 'error', 'message': 'Failed to generate visualization'}), 500
+    if png_path is None:
+        return jsonify({'status': 'error', 'message': 'Visualization not found'}), 404
+    return send_file(os.path.abspath(png_path), mimetype='image/png', max_age=3600)
+
 @app.route('/context', methods=['POST'])
 def context_and_improve():
     try:
@@ -494,36 +728,35 @@ def context_and_improve():
         # Import improve_email module and its helper functions
         import sys
         sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-        from improve_email import build_prompt, query_chatgpt, save_improved_result, get_latest_file
+        from improve_email import build_prompt, query_chatgpt, stream_chatgpt, save_improved_result, get_latest_file, LLM_MODEL_PARAMS
+        from improvement_cache import get_improvement_cache, improvement_key
         
         # Load the user's profile
         profile_filename = os.path.join(user_dir, 'profile.json')
         user_profile = {}
         
-        if os.path.exists(profile_filename):
-            try:
-                with open(profile_filename, 'r', encoding='utf-8') as f:
-                    user_profile = json.load(f)
+        try:
+            user_profile = profile_cache.get(profile_filename) or {}
+            if user_profile:
                 logging.info(f"Loaded user profile for {safe_user_id}")
-            except Exception as profile_err:
-                logging.error(f"Failed to read profile file: {profile_err}")
+        except Exception as profile_err:
+            logging.error(f"Failed to read profile file: {profile_err}")
                 
         # If profile doesn't exist or is empty, fall back to the latest tone file
         if not user_profile:
             logging.info("No profile found, using latest tone data as fallback")
-            tone_files = [f for f in os.listdir(user_dir) if f.startswith('tone_') and f.endswith('.json')]
+            tone_files = profile_cache.list_files(user_dir, 'tone_')
             
             # Check in analysis folder if no files found in user_dir
             if not tone_files and os.path.exists(os.path.join(user_dir, 'analysis')):
                 analysis_dir = os.path.join(user_dir, 'analysis')
-                tone_files = [f for f in os.listdir(analysis_dir) if f.startswith('tone_') and f.endswith('.json')]
+                tone_files = profile_cache.list_files(analysis_dir, 'tone_')
                 if tone_files:
-                    latest_tone_file = os.path.join(analysis_dir, sorted(tone_files)[-1])
+                    latest_tone_file = os.path.join(analysis_dir, tone_files[-1])
                     logging.info(f"Using existing tone file from analysis folder: {os.path.basename(latest_tone_file)}")
                     
                     try:
-                        with open(latest_tone_file, 'r', encoding='utf-8') as f:
-                            user_profile = json.load(f)
+                        user_profile = profile_cache.get(latest_tone_file)
                     except Exception as file_err:
                         logging.error(f"Failed to read tone file: {file_err}")
                         return jsonify({'status': 'error', 'message': 'Failed to read tone data'}), 500
@@ -535,7 +768,8 @@ def context_and_improve():
                 logging.info(f"No tone file found, creating new one from content (length={content_length})")
                 
                 try:
-                    features = extract_email_features(content)
+                    from feature_extraction import extract_email_features
+                    features = extract_email_features(content, feature_set="tone_axes_inputs")
                     tone_axes = classify_tone_axes(features)
                     
                     # Create analysis directory if it doesn't exist
@@ -551,12 +785,11 @@ def context_and_improve():
                     logging.error(f"Error creating tone file: {analysis_err}")
                     return jsonify({'status': 'error', 'message': 'Failed to analyze content'}), 500
             else:
-                latest_tone_file = os.path.join(user_dir, sorted(tone_files)[-1])
+                latest_tone_file = os.path.join(user_dir, tone_files[-1])
                 logging.info(f"Using existing tone file as profile fallback: {os.path.basename(latest_tone_file)}")
                 
                 try:
-                    with open(latest_tone_file, 'r', encoding='utf-8') as f:
-                        user_profile = json.load(f)
+                    user_profile = profile_cache.get(latest_tone_file)
                 except Exception as file_err:
                     logging.error(f"Failed to read tone file: {file_err}")
                     return jsonify({'status': 'error', 'message': 'Failed to read tone data'}), 500
@@ -577,21 +810,63 @@ def context_and_improve():
         
         logging.info(f"Processing improvement request - Subject: '{subject}', Content length: {content_length}")
         
-        try:
-            # Use the enhanced query_chatgpt function that selects style clusters
-            improved = query_chatgpt("", recipients_data, user_profile, content, subject)
-            
+        # Repeat requests for the same draft are answered from the user's improvement cache
+        # unless the client sends "use_cache": false
+        use_cache = data.get('use_cache', True) is not False
+        improvements = get_improvement_cache(user_dir)
+        cache_key = improvement_key(user_profile, subject, content, recipients_data, LLM_MODEL_PARAMS)
+        cached = improvements.get(cache_key) if use_cache else None
+        if use_cache:
+            cache_lookup("improvement", cached is not None)
+        if cached is not None:
+            logging.info(f"Serving cached improvement (cluster: {cached.get('cluster', 'Unknown')})")
+        
+        def record_improvement(improved):
             # Log the selected cluster for analytics
             selected_cluster = improved.get("cluster", "Unknown")
             logging.info(f"Improved email using cluster: {selected_cluster}")
             
+            # Only successful answers are worth repeating
+            if "error" not in improved and "parsing_error" not in improved:
+                improvements.put(cache_key, improved)
+            
             # Create validation report (not actively used in server mode)
             validation_report = {}
             
             # Save the improved email
             improved_path = save_improved_result(improved, validation_report, user_dir, safe_user_id)
             logging.info(f"Saved improved email to {os.path.basename(improved_path)}")
+        
+        # Server-sent events: field text as it is generated, then the full result
+        if request.args.get('stream') == '1' or data.get('stream') is True:
+            def sse(event_name, payload):
+                return f"event: {event_name}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
             
+            def generate():
+                if cached is not None:
+                    yield sse('done', {'status': 'success', 'improved': cached, 'cached': True})
+                    return
+                try:
+                    for kind, payload in stream_chatgpt(recipients_data, user_profile, content, subject):
+                        if kind == 'delta':
+                            yield sse('delta', payload)
+                        else:
+                            record_improvement(payload)
+                            yield sse('done', {'status': 'success', 'improved': payload})
+                except Exception as improvement_err:
+                    logging.error(f"Error streaming improved email: {improvement_err}")
+                    yield sse('error', {'status': 'error', 'message': 'Failed to improve the email'})
+            
+            return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+        if cached is not None:
+            return jsonify({'status': 'success', 'improved': cached, 'cached': True})
+        
+        try:
+            # Use the enhanced query_chatgpt function that selects style clusters
+            improved = query_chatgpt("", recipients_data, user_profile, content, subject)
+            record_improvement(improved)
             return jsonify({'status': 'success', 'improved': improved})
         except Exception as improvement_err:
             logging.error(f"Error improving email: {improvement_err}")
@@ -605,4 +880,9 @@ def context_and_improve():
         return jsonify({'status': 'error', 'message': 'An internal error occurred. Please try again later.'}), 500
 
 if __name__ == '__main__':
+    # Only the reloader's serving child needs the pool, not the file-watching parent
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_feature_pool()
+        # Ready once the heavy modules are imported here and every pool worker has loaded the model
+        start_warmup(on_ready=lambda: start_feature_pool(wait=True))
     app.run(host='0.0.0.0', port=27481, debug=True) 
\ No newline at end of file
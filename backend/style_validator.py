@@ -15,7 +15,7 @@ def validate_style_match(original_profile, generated_email):
     """
     # Extract features and classify tone of the generated email
     try:
-        features = extract_email_features(generated_email)
+        features = extract_email_features(generated_email, feature_set="validation")
         tone_axes = classify_tone_axes(features)
     except Exception as e:
         return {
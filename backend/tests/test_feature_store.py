@@ -0,0 +1,50 @@
+import os
+import sys
+import json
+import math
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from feature_store import FeatureStore
+
+def _features(**overrides):
+    features = {
+        "word_count": 12,
+        "sentiment": 0.25,
+        "greeting_found": True,
+        "flesch_kincaid_grade": 8.4,
+        "pronoun_ratios": {"I": 0.1, "you": 0.05},
+        "common_words": [["hello", 2]],
+    }
+    features.update(overrides)
+    return features
+
+def test_none_round_trips_as_none(tmp_path):
+    store = FeatureStore(str(tmp_path / "features"))
+    original = [_features(), _features(flesch_kincaid_grade=None), {}]
+    store.append(original, "b1")
+
+    grade = store.column("flesch_kincaid_grade")
+    assert grade[0] == 8.4 and math.isnan(grade[1]) and grade[2] == 0
+    assert store.records() == [original[0], original[1], {}]
+
+def test_first_none_widens_int_column(tmp_path):
+    store = FeatureStore(str(tmp_path / "features"))
+    store.append([_features(word_count=3), _features(word_count=5)], "b1")
+    assert store.column("word_count").dtype == "<i4"
+
+    store.append([_features(word_count=None), _features()], "b2")
+    assert store.column("word_count").dtype == "<f8"
+    assert [record["word_count"] for record in store.records()] == [3, 5, None, 12]
+
+    # The widened column lives in a new file; the old one is gone and meta points at the new one
+    with open(os.path.join(store.path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    assert meta["files"]["word_count"] == "word_count.f8.col"
+    assert not os.path.exists(os.path.join(store.path, "word_count.col"))
+
+def test_missing_feature_reads_back_as_none(tmp_path):
+    store = FeatureStore(str(tmp_path / "features"))
+    without_grade = _features()
+    del without_grade["flesch_kincaid_grade"]
+    store.append([_features(), without_grade], "b1")
+    assert store.records()[1]["flesch_kincaid_grade"] is None
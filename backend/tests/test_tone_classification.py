@@ -0,0 +1,30 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from feature_store import FeatureStore
+from tone_classification import classify_tone_axes, classify_tone_axes_batch, classify_feature_store, feature_columns
+
+FEATURES = [
+    {"contraction_count": 0, "politeness_counts": {"please": 1, "thanks": 0}, "hedge_count": 0,
+     "certainty_count": 2, "greeting_found": True, "closing_found": True, "flesch_kincaid_grade": 11.2,
+     "avg_sentence_length": 18.0, "emoji_count": 0, "emoticon_count": 0, "passive_count": 1,
+     "sentiment": 0.3, "subjectivity": 0.4, "exclamation_count": 0,
+     "pronoun_ratios": {"I": 0.02, "you": 0.08}, "modal_count": 1},
+    {"contraction_count": 4, "politeness_counts": {"please": 0, "thanks": 0}, "hedge_count": 3,
+     "certainty_count": 0, "greeting_found": False, "closing_found": False, "flesch_kincaid_grade": None,
+     "avg_sentence_length": 6.0, "emoji_count": 5, "emoticon_count": 1, "passive_count": 0,
+     "sentiment": -0.4, "subjectivity": 0.9, "exclamation_count": 3,
+     "pronoun_ratios": {"I": 0.1, "you": 0.0}, "modal_count": 5},
+]
+
+def test_batch_matches_scalar():
+    batch = classify_tone_axes_batch(feature_columns(FEATURES + [{}]))
+    assert batch.to_list() == [classify_tone_axes(features) for features in FEATURES] + [{}]
+
+def test_stored_history_matches_scalar(tmp_path):
+    store = FeatureStore(str(tmp_path / "features"))
+    store.append(FEATURES, "b1")
+    tone_axes = classify_feature_store(store).to_list()
+    assert tone_axes == [classify_tone_axes(features) for features in FEATURES]
+    assert tone_axes[1]["readability"] is None
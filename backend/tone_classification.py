@@ -1,3 +1,6 @@
+import numpy as np
+from feature_store import FeatureStore
+
 def classify_tone_axes(features):
     """
     Classify email tone along various axes based on feature set.
@@ -71,4 +74,174 @@ def classify_tone_axes(features):
         return tone_axes
     except Exception as e:
         # Provide context when encountering unexpected errors
-        raise ValueError(f"Error in tone classification: {str(e)}") from e 
\ No newline at end of file
+        raise ValueError(f"Error in tone classification: {str(e)}") from e
+
+
+# Axis order of classify_tone_axes results
+TONE_AXES = ("formality", "politeness", "certainty", "greeting", "closing", "readability",
+             "emoji_usage", "passive_voice", "emotion", "directness", "subjectivity_level")
+
+# Labels of each categorical axis; ToneAxesBatch codes index into these tuples
+TONE_AXIS_CATEGORIES = {
+    "formality": ("informal", "formal"),
+    "politeness": ("blunt", "polite"),
+    "certainty": ("hedged", "certain"),
+    "greeting": ("absent", "present"),
+    "closing": ("absent", "present"),
+    "emoji_usage": ("none", "some", "high"),
+    "passive_voice": ("absent", "present"),
+    "emotion": ("neutral", "positive", "negative", "frustrated"),
+    "directness": ("indirect", "direct"),
+    "subjectivity_level": ("objective", "personal"),
+}
+
+class ToneAxesBatch:
+    """
+    Tone axes of many emails as categorical code arrays.
+
+    codes[axis] holds indexes into TONE_AXIS_CATEGORIES[axis] and
+    readability the Flesch-Kincaid grade (NaN when unknown). Indexing or
+    iterating yields the same dicts classify_tone_axes returns, built only
+    when asked for; rows marked invalid come back as empty dicts.
+    """
+
+    def __init__(self, codes, readability, valid):
+        self.codes = codes
+        self.readability = readability
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.valid)
+
+    def __getitem__(self, index):
+        if not self.valid[index]:
+            return {}
+        tone_axes = {}
+        for axis in TONE_AXES:
+            if axis == "readability":
+                grade = self.readability[index]
+                tone_axes[axis] = None if np.isnan(grade) else grade.item()
+            else:
+                tone_axes[axis] = TONE_AXIS_CATEGORIES[axis][self.codes[axis][index]]
+        return tone_axes
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def labels(self, axis):
+        """Array of category labels for one axis"""
+        return np.asarray(TONE_AXIS_CATEGORIES[axis])[self.codes[axis]]
+
+    def to_list(self):
+        return list(self)
+
+def feature_columns(features_list):
+    """
+    Column arrays of feature dicts, named like FeatureStore columns.
+
+    Features missing from a dict are NaN; the "valid" column marks non-empty dicts.
+    """
+    rows = len(features_list)
+    columns = {}
+    for i, features in enumerate(features_list):
+        row_columns, _ = FeatureStore.split_record(features)
+        for name, value in row_columns.items():
+            column = columns.get(name)
+            if column is None:
+                column = columns[name] = np.full(rows, np.nan)
+            column[i] = value
+    columns["valid"] = np.array([bool(features) for features in features_list], dtype=bool)
+    return columns
+
+def _as_columns(features):
+    if isinstance(features, np.ndarray):
+        if features.dtype.names is None:
+            raise ValueError("Feature array must be a structured array with named fields")
+        return {name: features[name] for name in features.dtype.names}
+    return features
+
+def classify_tone_axes_batch(features):
+    """
+    Classify the tone axes of many emails at once with vectorized comparisons.
+
+    Applies the same rules as classify_tone_axes to whole feature columns,
+    so re-classifying a stored history is a handful of NumPy operations.
+
+    Args:
+        features: Dict of column name -> array (as returned by feature_columns
+            or FeatureStore.columns) or a NumPy structured array with those
+            field names. Dict-valued features use dotted names such as
+            "pronoun_ratios.you"; an optional boolean "valid" column marks
+            emails that failed extraction.
+
+    Returns:
+        ToneAxesBatch: Codes for every axis plus a lazy dict view
+
+    Raises:
+        ValueError: If the columns have different lengths
+    """
+    columns = _as_columns(features)
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"Feature columns have different lengths: {sorted(lengths)}")
+    rows = lengths.pop() if lengths else 0
+
+    def column(name, default=0.0):
+        values = columns.get(name)
+        if values is None:
+            return np.full(rows, default)
+        values = np.asarray(values, dtype=float)
+        return np.where(np.isnan(values), default, values)
+
+    contraction_count = column("contraction_count")
+    total_politeness = sum((column(name) for name in columns if name.startswith("politeness_counts.")),
+                           np.zeros(rows))
+    hedge_count = column("hedge_count")
+    certainty_count = column("certainty_count")
+    greeting_found = column("greeting_found") != 0
+    closing_found = column("closing_found") != 0
+    flesch_kincaid = column("flesch_kincaid_grade", np.nan)
+    avg_sentence_length = column("avg_sentence_length")
+    emoji_count = column("emoji_count")
+    emoticon_count = column("emoticon_count")
+    passive_count = column("passive_count")
+    sentiment = column("sentiment")
+    subjectivity = column("subjectivity", 0.5)
+    exclamation_count = column("exclamation_count")
+    you_ratio = column("pronoun_ratios.you")
+    modal_count = column("modal_count")
+
+    def sign(condition):
+        return np.where(condition, 1, -1)
+
+    formality_score = (sign(contraction_count < 2) + sign(avg_sentence_length > 15)
+                       + sign((flesch_kincaid != 0) & (flesch_kincaid > 10)) + sign(passive_count > 0)
+                       + sign(greeting_found & closing_found)
+                       - ((emoji_count > 0) | (emoticon_count > 0)))
+    directness_score = (you_ratio > 0.05).astype(int) - (modal_count > 3) - (hedge_count > 1)
+
+    # Codes follow the order of TONE_AXIS_CATEGORIES; later np.where calls take precedence
+    emotion = np.where(sentiment > 0.2, 1, np.where(sentiment < -0.2, 2, 0))
+    emotion = np.where((exclamation_count > 1) & (sentiment < -0.1), 3, emotion)
+    emoji_usage = np.where(emoji_count > 3, 2, np.where((emoji_count > 0) | (emoticon_count > 0), 1, 0))
+
+    codes = {
+        "formality": formality_score > 0,
+        "politeness": total_politeness > 0,
+        "certainty": certainty_count > hedge_count,
+        "greeting": greeting_found,
+        "closing": closing_found,
+        "emoji_usage": emoji_usage,
+        "passive_voice": passive_count > 0,
+        "emotion": emotion,
+        "directness": directness_score > 0,
+        "subjectivity_level": subjectivity > 0.5,
+    }
+    codes = {axis: np.asarray(value, dtype=np.uint8) for axis, value in codes.items()}
+    valid = columns.get("valid")
+    valid = np.ones(rows, dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+    return ToneAxesBatch(codes, flesch_kincaid, valid)
+
+def classify_feature_store(store, start=0, stop=None):
+    """Tone axes of rows [start, stop) of a FeatureStore, read straight from its columns"""
+    return classify_tone_axes_batch(store.columns(None, start, stop))
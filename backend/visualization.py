@@ -0,0 +1,238 @@
+import os
+import json
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from metrics import timed
+
+# Seconds a request waits for a PNG to be rendered
+RENDER_TIMEOUT = int(os.getenv("WRITEWISE_RENDER_TIMEOUT", 60))
+
+# Number of strongest feature loadings drawn as arrows on the cluster plot
+MAX_FEATURE_ARROWS = 9
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def clustering_path(user_dir, timestamp):
+    return os.path.join(user_dir, "analysis", f"clusters_{timestamp}.npz")
+
+def visualization_path(user_dir, timestamp):
+    return os.path.join(user_dir, "analysis", "visualizations", f"clusters_{timestamp}.png")
+
+def latest_clustering_timestamp(user_dir):
+    """Timestamp of the most recent saved clustering, or None"""
+    analysis_dir = os.path.join(user_dir, "analysis")
+    if not os.path.isdir(analysis_dir):
+        return None
+    stamps = sorted(f[len("clusters_"):-len(".npz")] for f in os.listdir(analysis_dir)
+                    if f.startswith("clusters_") and f.endswith(".npz"))
+    return stamps[-1] if stamps else None
+
+def save_clustering(user_dir, timestamp, clustering):
+    """
+    Persist a ClusteringResult so the plot can be produced later without re-clustering.
+
+    Returns:
+        str: Path of the saved .npz file
+    """
+    path = clustering_path(user_dir, timestamp)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(
+        path,
+        matrix=clustering.matrix,
+        feature_names=np.array(clustering.feature_names, dtype=str),
+        labels=clustering.labels,
+        centroids=clustering.centroids,
+        n_clusters=np.array(clustering.n_clusters)
+    )
+    return path
+
+def load_clustering(path):
+    """Load a clustering saved by save_clustering as a ClusteringResult"""
+    from profile_aggregation import ClusteringResult
+    with np.load(path, allow_pickle=False) as data:
+        return ClusteringResult(
+            matrix=data["matrix"],
+            feature_names=[str(name) for name in data["feature_names"]],
+            labels=data["labels"],
+            centroids=data["centroids"],
+            n_clusters=int(data["n_clusters"])
+        )
+
+def compute_projection(clustering):
+    """
+    Project emails and centroids onto the first two principal components.
+
+    Returns:
+        dict: JSON-serializable coordinates, labels, explained variance and
+            feature loadings, enough for a client to draw the plot itself
+    """
+    from sklearn.decomposition import PCA
+    pca = PCA(n_components=2)
+    points = pca.fit_transform(clustering.matrix)
+    centroids = pca.transform(clustering.centroids)
+    return {
+        "n_clusters": clustering.n_clusters,
+        "points": np.round(points, 4).tolist(),
+        "labels": [int(label) for label in clustering.labels],
+        "centroids": np.round(centroids, 4).tolist(),
+        "explained_variance": [float(v) for v in pca.explained_variance_ratio_],
+        "loadings": {
+            name: [round(float(pca.components_[0, i]), 4), round(float(pca.components_[1, i]), 4)]
+            for i, name in enumerate(clustering.feature_names)
+        }
+    }
+
+def render_projection_png(projection, out_path):
+    """
+    Render a projection to a 300-dpi PNG.
+
+    Uses the object-oriented matplotlib API on an Agg canvas rather than
+    pyplot, so no global figure state is shared between threads.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    points = np.asarray(projection["points"])
+    centroids = np.asarray(projection["centroids"])
+    variance = projection["explained_variance"]
+
+    fig = Figure(figsize=(10, 8))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    scatter = ax.scatter(points[:, 0], points[:, 1], c=projection["labels"], cmap='viridis', s=100, alpha=0.8)
+
+    # Add centroids
+    ax.scatter(centroids[:, 0], centroids[:, 1], marker='X', s=200, color='red', label='Centroids')
+
+    # Add styling and information
+    ax.set_title(f'Email Style Clusters ({projection["n_clusters"]} Clusters Identified)', fontsize=16)
+    ax.set_xlabel(f'Principal Component 1 ({variance[0]:.2%} variance)', fontsize=14)
+    ax.set_ylabel(f'Principal Component 2 ({variance[1]:.2%} variance)', fontsize=14)
+    fig.colorbar(scatter, ax=ax, label='Cluster')
+    ax.legend()
+    ax.grid(alpha=0.3)
+
+    # Add contribution arrows for the features that load most on the two components
+    loadings = sorted(projection["loadings"].items(), key=lambda item: np.hypot(*item[1]), reverse=True)
+    # Scale the feature arrows to fit nicely on the plot
+    scale = 2
+    for feature, (x, y) in loadings[:MAX_FEATURE_ARROWS]:
+        ax.arrow(0, 0, x * scale, y * scale,
+                 head_width=0.1, head_length=0.1, fc='blue', ec='blue', alpha=0.5)
+        ax.text(x * scale * 1.15, y * scale * 1.15, feature, fontsize=12)
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = f"{out_path}.{os.getpid()}.tmp.png"
+    fig.tight_layout()
+    fig.savefig(tmp_path, dpi=300)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def _render_saved_clustering(npz_path, out_path):
+    """Worker-process entry point: load a saved clustering and render its PNG"""
+    return render_projection_png(compute_projection(load_clustering(npz_path)), out_path)
+
+def _get_render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=1)
+        return _render_pool
+
+def _reset_render_pool(pool):
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False)
+
+def get_projection(user_dir, timestamp):
+    """
+    JSON projection for a saved clustering, cached next to it on disk.
+
+    Returns:
+        dict or None if no clustering was saved for the timestamp
+    """
+    npz_path = clustering_path(user_dir, timestamp)
+    if not os.path.exists(npz_path):
+        return None
+    cache_path = npz_path[:-len(".npz")] + ".projection.json"
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    projection = compute_projection(load_clustering(npz_path))
+    tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(projection, f)
+    os.replace(tmp_path, cache_path)
+    return projection
+
+def get_visualization_png(user_dir, timestamp):
+    """
+    Path of the cluster PNG for a saved clustering, rendering it in a worker process on first use.
+
+    The PNG is cached on disk per analysis timestamp, i.e. per profile version.
+
+    Returns:
+        str or None if no clustering was saved for the timestamp
+    """
+    png_path = visualization_path(user_dir, timestamp)
+    if os.path.exists(png_path):
+        return png_path
+    npz_path = clustering_path(user_dir, timestamp)
+    if not os.path.exists(npz_path):
+        return None
+    pool = _get_render_pool()
+    with timed("plot_render"):
+        try:
+            future = pool.submit(_render_saved_clustering, npz_path, png_path)
+            future.result(timeout=RENDER_TIMEOUT)
+        except BrokenProcessPool as e:
+            # A crashed renderer breaks the pool for good; start a fresh one on the next request
+            logging.error(f"Render pool broke, it will be restarted: {e}")
+            _reset_render_pool(pool)
+            raise
+    logging.info(f"Rendered cluster visualization {os.path.basename(png_path)}")
+    return png_path
+
+def generate_cluster_visualization(user_dir, tone_axes_list, user_id, timestamp, clustering=None):
+    """
+    Generates a visualization of tone clusters reduced to 2 principal components.
+
+    Renders in the calling process; the server uses get_visualization_png instead.
+
+    Args:
+        user_dir: Directory to save the visualization
+        tone_axes_list: List of tone classification results
+        user_id: User identifier
+        timestamp: Current timestamp string
+        clustering: ClusteringResult shared with the profile aggregation;
+            computed from tone_axes_list if omitted
+
+    Returns:
+        str: Path to the generated visualization file
+    """
+    # Skip if we don't have at least 2 data points
+    if not tone_axes_list or len(tone_axes_list) < 2:
+        logging.warning("Not enough data points for clustering visualization")
+        return None
+
+    try:
+        if clustering is None:
+            from profile_aggregation import cluster_tone_axes_matrix
+            clustering = cluster_tone_axes_matrix(tone_axes_list)
+        if clustering is None or clustering.matrix.shape[1] < 2:
+            logging.warning("Not enough features for clustering visualization")
+            return None
+        viz_file = render_projection_png(compute_projection(clustering), visualization_path(user_dir, timestamp))
+        logging.info(f"Generated cluster visualization with {clustering.n_clusters} clusters")
+        return viz_file
+    except Exception as e:
+        logging.error(f"Error generating cluster visualization: {e}")
+        import traceback
+        logging.error(traceback.format_exc())
+        return None
@@ -0,0 +1,102 @@
+import time
+import logging
+import importlib
+import threading
+
+# Modules imported in the background after startup, slowest first. feature_extraction
+# loads spaCy with en_core_web_sm, TextBlob and textstat; profile_aggregation pulls in
+# sklearn, pandas and kneed; improve_email is needed by /context. A module's warm_up()
+# function, if it has one, runs right after its import.
+WARMUP_MODULES = ("feature_extraction", "profile_aggregation", "improve_email")
+
+_status = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "import_seconds": {},
+    "error": None,
+}
+_status_lock = threading.Lock()
+_thread = None
+
+def _import_modules(modules):
+    """Import modules in order, running their warm_up() if they define one; False if one failed"""
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            module = importlib.import_module(name)
+            warm_up = getattr(module, "warm_up", None)
+            if warm_up is not None:
+                warm_up()
+        except Exception as e:
+            logging.error(f"Warmup failed importing {name}: {e}")
+            with _status_lock:
+                _status["error"] = f"{name}: {e}"
+            return False
+        with _status_lock:
+            _status["import_seconds"][name] = round(time.perf_counter() - started, 3)
+    return True
+
+def _mark_ready():
+    with _status_lock:
+        _status["ready"] = True
+        _status["finished_at"] = time.time()
+        breakdown = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in _status["import_seconds"].items())
+        total = _status["finished_at"] - _status["started_at"]
+    logging.info(f"Warmup finished in {total:.2f}s ({breakdown})")
+
+def _warm(modules, on_ready):
+    if not _import_modules(modules):
+        return
+
+    if on_ready is not None:
+        try:
+            on_ready()
+        except Exception as e:
+            logging.error(f"Warmup callback failed: {e}")
+            with _status_lock:
+                _status["error"] = str(e)
+            return
+
+    _mark_ready()
+
+def preload(modules=WARMUP_MODULES):
+    """
+    Import the heavy modules synchronously.
+
+    Used by the WSGI entry point so a gunicorn master loads the models once
+    before forking; workers inherit them, and the ready status, as is.
+
+    Returns:
+        bool: True if every module was imported
+    """
+    with _status_lock:
+        _status["started_at"] = time.time()
+    if not _import_modules(modules):
+        return False
+    _mark_ready()
+    return True
+
+def start_warmup(modules=WARMUP_MODULES, on_ready=None):
+    """
+    Import the heavy modules on a background thread.
+
+    Requests that need a module before the warmup reaches it simply import
+    it themselves (the import lock makes them wait for the same import).
+
+    Args:
+        modules: Module names to import, in order
+        on_ready: Optional callable run after the imports, e.g. to start the worker pool
+    """
+    global _thread
+    with _status_lock:
+        if _thread is not None:
+            return
+        _status["started_at"] = time.time()
+        _thread = threading.Thread(target=_warm, args=(modules, on_ready), name="warmup", daemon=True)
+    _thread.start()
+
+def warmup_status():
+    """Snapshot of the warmup: readiness, per-module import seconds and any error"""
+    with _status_lock:
+        return dict(_status, import_seconds=dict(_status["import_seconds"]))
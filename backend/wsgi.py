@@ -0,0 +1,22 @@
+"""
+WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app (set in gunicorn.conf.py) this module is imported once in
+the gunicorn master: the spaCy model, lexicons and scikit-learn are loaded
+there and every forked worker shares those pages copy-on-write instead of
+loading its own copy.
+"""
+import gc
+import logging
+from server import app  # noqa: F401
+from warmup import preload
+
+if not preload():
+    logging.error("Preloading models failed; workers will load them on first use")
+
+# Move everything loaded so far out of the collector's reach: a collection in a
+# worker would otherwise write to the GC headers of these objects and copy their pages
+gc.collect()
+gc.freeze()